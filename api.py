@@ -0,0 +1,212 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, request, abort, current_app
+
+from app import db
+from model import Venue, Artist, Show
+from queries import encode_cursor, decode_cursor
+from bookings import check_bookings
+from matching import match_artists, MAX_MATCHES
+from autocomplete import NAME_INDEXES, MAX_SUGGESTIONS
+from replicas import read_only
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# ----------------------------------------------------------------------------#
+# JSON API.
+# Every response is built from a column-only select of just the requested
+# fields (?fields=id,name), so no ORM objects are loaded, and carries an
+# ETag over its body; a matching If-None-Match gets an empty 304.
+# Lists are keyset-paginated on id:
+#   {"data": [...], "next_cursor": "WzUwXQ"}  ->  ?cursor=WzUwXQ
+# ----------------------------------------------------------------------------#
+class Resource:
+    def __init__(self, model, columns, joins=(), filters=None):
+        self.model = model
+        # field name -> column expression, in output order
+        self.columns = {column.key: column for column in columns}
+        self.joins = joins
+        # query argument -> function(value) returning a where clause
+        self.filters = filters or {}
+
+    def select(self, fields):
+        select = db.select(*(self.columns[field] for field in fields)).select_from(self.model)
+        for target, onclause in self.joins:
+            select = select.join(target, onclause)
+        return select
+
+def _time(value):
+    return datetime.fromisoformat(value)
+
+RESOURCES = {
+    'venues': Resource(Venue,
+                       [Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.phone,
+                        Venue.genres, Venue.image_link, Venue.facebook_link, Venue.website,
+                        Venue.seeking_talent, Venue.seeking_description,
+                        Venue.upcoming_shows_count, Venue.past_shows_count, Venue.next_show_time],
+                       filters={'city': lambda value: Venue.city == value,
+                                'state': lambda value: Venue.state == value}),
+    'artists': Resource(Artist,
+                        [Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+                         Artist.genres, Artist.image_link, Artist.facebook_link, Artist.website,
+                         Artist.seeking_venue, Artist.seeking_description,
+                         Artist.upcoming_shows_count, Artist.past_shows_count, Artist.next_show_time],
+                        filters={'city': lambda value: Artist.city == value,
+                                 'state': lambda value: Artist.state == value}),
+    'shows': Resource(Show,
+                      [Show.id, Show.start_time, Show.venue_id, Venue.name.label('venue_name'),
+                       Show.artist_id, Artist.name.label('artist_name'),
+                       Artist.image_link.label('artist_image_link')],
+                      joins=[(Venue, Venue.id == Show.venue_id), (Artist, Artist.id == Show.artist_id)],
+                      filters={'venue_id': lambda value: Show.venue_id == int(value),
+                               'artist_id': lambda value: Show.artist_id == int(value),
+                               'start': lambda value: Show.start_time >= _time(value),
+                               'end': lambda value: Show.start_time < _time(value)}),
+}
+
+# ----------------------------------------------------------------------------#
+# Serialization.
+# orjson when it is installed (it encodes datetimes itself), the standard
+# library otherwise.
+# ----------------------------------------------------------------------------#
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, separators=(',', ':')).encode()
+
+def json_response(data):
+    response = Response(dumps(data), mimetype='application/json')
+    response.add_etag()
+    return response.make_conditional(request)
+
+def requested_fields(resource):
+    # ?fields=id,name -> ['id', 'name']; every field by default
+    fields = request.args.get('fields')
+    if not fields:
+        return list(resource.columns)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in resource.columns]
+    if unknown or not fields:
+        abort(400, 'unknown fields: {}'.format(', '.join(unknown)))
+    return fields
+
+def _resource(kind):
+    if kind not in RESOURCES:
+        abort(404)
+    return RESOURCES[kind]
+
+# ----------------------------------------------------------------------------#
+# Endpoints.
+# ----------------------------------------------------------------------------#
+@api.route('/<kind>')
+def list_resource(kind):
+    resource = _resource(kind)
+    fields = requested_fields(resource)
+    id_column = resource.model.id
+    try:
+        after = decode_cursor(request.args['cursor'], int) if request.args.get('cursor') else None
+        criteria = [where(request.args[name]) for name, where in resource.filters.items() if request.args.get(name)]
+    except ValueError:
+        abort(400)
+    per_page = request.args.get('per_page', current_app.config['PAGE_SIZE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['MAX_PAGE_SIZE']))
+
+    # the id rides along as the last column for the cursor
+    select = resource.select(fields).add_columns(id_column).where(*criteria)
+    if after is not None:
+        select = select.where(id_column > after[0])
+    rows = db.session.execute(select.order_by(id_column).limit(per_page + 1)).all()
+    next_key = (rows[per_page - 1][-1],) if len(rows) > per_page else None
+
+    return json_response({'data': [dict(zip(fields, row)) for row in rows[:per_page]],
+                          'next_cursor': encode_cursor(next_key)})
+
+@api.route('/<kind>/<int:id>')
+def get_resource(kind, id):
+    resource = _resource(kind)
+    fields = requested_fields(resource)
+    row = db.session.execute(resource.select(fields).where(resource.model.id == id)).first()
+    if row is None:
+        abort(404)
+
+    return json_response({'data': dict(zip(fields, row))})
+
+# ----------------------------------------------------------------------------#
+# Booking check.
+# GET ?venue_id=&artist_id=&start_time= checks one proposed show (the show
+# form calls it as the fields change); POST {"shows": [{...}, ...]} checks up
+# to MAX_BOOKING_CHECK at once. Nothing is locked: /shows/create checks
+# again before it inserts.
+#   {"data": [{"available": false, "errors": {"venue_id": ["..."]}}, ...]}
+# ----------------------------------------------------------------------------#
+MAX_BOOKING_CHECK = 5000
+
+def _proposal(values):
+    return int(values['venue_id']), int(values['artist_id']), _time(values['start_time'])
+
+@api.route('/bookings/check', methods=['GET', 'POST'])
+@read_only
+def check_booking():
+    try:
+        if request.method == 'POST':
+            shows = (request.get_json(silent=True) or {}).get('shows')
+            if not isinstance(shows, list) or len(shows) > MAX_BOOKING_CHECK:
+                abort(400, 'expected a "shows" list of at most {} shows'.format(MAX_BOOKING_CHECK))
+            proposals = [_proposal(show) for show in shows]
+        else:
+            proposals = [_proposal(request.args)]
+    except (KeyError, TypeError, ValueError):
+        abort(400, 'every show needs an integer venue_id and artist_id and an ISO start_time')
+
+    results = check_bookings(proposals)
+    return Response(dumps({'data': [{'available': not errors, 'errors': errors} for errors in results]}),
+                    mimetype='application/json')
+
+# ----------------------------------------------------------------------------#
+# Matchmaking.
+# GET /venues/<id>/matches?limit=10: the artists seeking a venue that best
+# fit a venue seeking talent, see matching.py.
+#   {"data": [{"artist_id": 7, "score": 7.5, "shared_genres": ["Jazz"], ...}, ...]}
+# ----------------------------------------------------------------------------#
+@api.route('/venues/<int:venue_id>/matches')
+def venue_matches(venue_id):
+    venue = db.session.execute(db.select(Venue.id, Venue.genres, Venue.genre_mask, Venue.city, Venue.state,
+                                         Venue.seeking_talent).where(Venue.id == venue_id)).first()
+    if venue is None:
+        abort(404)
+    if not venue.seeking_talent:
+        abort(404, 'venue {} is not seeking talent'.format(venue_id))
+    limit = max(1, min(request.args.get('limit', 10, type=int), MAX_MATCHES))
+
+    return json_response({'data': match_artists(venue, limit)})
+
+# ----------------------------------------------------------------------------#
+# Autocomplete.
+# GET /venues/autocomplete?q=blue and /artists/autocomplete?q=blue: venues or
+# artists whose name or a word of it starts with q, from the in-memory
+# NameIndex of autocomplete.py. The show form uses it to fill in the ids.
+#   {"data": [{"id": 4, "name": "Blue Velvet Hall", "city": "San Francisco"}, ...]}
+# ----------------------------------------------------------------------------#
+@api.route('/<any(venues, artists):kind>/autocomplete')
+def autocomplete(kind):
+    limit = max(1, min(request.args.get('limit', 10, type=int), MAX_SUGGESTIONS))
+    return json_response({'data': NAME_INDEXES[kind].suggest(request.args.get('q', ''), limit)})
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def api_error(error):
+    return Response(dumps({'error': error.description}), status=error.code, mimetype='application/json')
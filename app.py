@@ -5,22 +5,38 @@ import logging
 import traceback
 from logging import Formatter, FileHandler
 import sys
+import hashlib
+from datetime import datetime, timezone
+from functools import lru_cache
 import babel
+import babel.dates
 import dateutil.parser
 from flask import (
   Flask,
   render_template,
   request,
   Response,
+  make_response,
+  session,
+  g,
+  has_app_context,
   flash,
   redirect,
   url_for,
   abort,
+  jsonify,
+  stream_with_context,
 )
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
 from flask_migrate import Migrate
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import SQLAlchemyError
 from forms import *
+import instrumentation
+from replicas import RoutingSession, ReplicaRouter, read_only, primary
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -28,7 +44,9 @@ from forms import *
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+instrumentation.init_app(app)
+replicas = ReplicaRouter(db, app)
 
 # TODO: connect to a local postgresql database
 migrate = Migrate(app, db)
@@ -37,20 +55,170 @@ migrate = Migrate(app, db)
 # Import Model
 #----------------------------------------------------------------------------#
 from model import *
+from queries import (
+  encode_cursor,
+  decode_cursor,
+  venue_directory,
+  artist_directory,
+  show_feed,
+  VENUE_DIRECTORY_KEY,
+  ARTIST_DIRECTORY_KEY,
+  SHOW_FEED_KEY,
+  listing_state,
+  detail_page_state,
+)
+from search import search, search_changed
+from cache import PageCache, FragmentCache, LRUCache
+from export import export, EXPORT_COLUMNS, FORMATS
+from commands import counters, genre_masks, purge, importer, exporter
+from bookings import check_bookings
+from facets import parse_filters, filter_criteria, facet_counts
+from matching import artist_matrix
+from autocomplete import names_changed
+from api import api
+
+page_cache = PageCache(LRUCache(app.config['PAGE_CACHE_SIZE']), app.config['PAGE_CACHE_TTL'])
+page_change_hooks.append(page_cache.invalidate)
+page_change_hooks.append(artist_matrix.invalidate)
+page_change_hooks.append(names_changed)
+page_change_hooks.append(search_changed)
+fragment_cache = FragmentCache(LRUCache(app.config['FRAGMENT_CACHE_SIZE']), app.config['FRAGMENT_CACHE_TTL'])
+app.cli.add_command(counters)
+app.cli.add_command(genre_masks)
+app.cli.add_command(purge)
+app.cli.add_command(importer)
+app.cli.add_command(exporter)
+app.register_blueprint(api)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@lru_cache(maxsize=None)
+def datetime_formatter(format, locale):
+  # parsing the Babel pattern and locale is most of format_datetime's cost,
+  # so do it once per (format, locale)
+  pattern = babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+  locale = babel.Locale.parse(locale)
+  return lambda date: pattern.apply(date, locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  # the models hand over datetimes; strings are still accepted
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+
+  # listings repeat timestamps, so memoize them for the current request
+  memo = None
+  if app.config['DATETIME_FILTER_MEMO'] and has_app_context():
+    memo = g.setdefault('datetime_memo', {})
+  if memo is not None and (value, format, locale) in memo:
+    return memo[value, format, locale]
+  formatted = datetime_formatter(format, locale)(value)
+  if memo is not None:
+    memo[value, format, locale] = formatted
+
+  return formatted
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Templates.
+#----------------------------------------------------------------------------#
+if app.config['JINJA_BYTECODE_CACHE']:
+  # a new worker loads compiled templates instead of parsing them again
+  app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+
+def tiles(macro, items):
+  # {{ tiles('show_tile', shows) }}: the macro of pages/_tiles.html for each
+  # item, through fragment_cache
+  render = getattr(app.jinja_env.get_template('pages/_tiles.html').module, macro)
+  return Markup(fragment_cache.render_many(macro, items, render))
+
+app.jinja_env.globals['tiles'] = tiles
+
+#----------------------------------------------------------------------------#
+# Pagination.
+#----------------------------------------------------------------------------#
+def page_request(key_types):
+  # (after, limit) for the listing queries from ?cursor=&per_page=
+  token = request.args.get('cursor')
+  try:
+    after = decode_cursor(token, *key_types) if token else None
+  except ValueError:
+    abort(400)
+  per_page = request.args.get('per_page', app.config['PAGE_SIZE'], type=int)
+
+  return after, max(1, min(per_page, app.config['MAX_PAGE_SIZE']))
+
+def url_with(endpoint=None, **changes):
+  # the current URL (or endpoint) with some query arguments replaced; None
+  # drops one, a list repeats it: url_with(cursor=None, genre=['Jazz', 'Blues'])
+  args = request.args.to_dict(flat=False)
+  args.update(changes)
+  args = {name: value for name, value in args.items() if value not in (None, [], ())}
+  return url_for(endpoint or request.endpoint, **args)
+
+app.jinja_env.globals['url_with'] = url_with
+
+def past_shows_request():
+  # key of the last past show already seen on a detail page, from ?past_cursor=
+  token = request.args.get('past_cursor')
+  try:
+    return decode_cursor(token, *SHOW_FEED_KEY) if token else None
+  except ValueError:
+    abort(400)
+
+def search_page_request():
+  # (page, per_page) for search results from ?page=
+  page = max(1, request.values.get('page', 1, type=int))
+
+  return page, app.config['SEARCH_PAGE_SIZE']
+
+def cached_page(key, page_state, render):
+  # first page of a venue/artist comes from page_cache unless a flash is
+  # pending, for as long as page_state (see conditional_page) is the same
+  if page_state is None or request.args or session.get('_flashes'):
+    return render()[0]
+  version = hashlib.md5(repr(page_state[0]).encode()).hexdigest()
+
+  # cache fills read the primary so a lagging replica is never cached
+  def render_from_primary():
+    with primary():
+      return render()
+
+  return page_cache.get_or_render(key, render_from_primary, version)
+
+def conditional_page(page_state, render):
+  # 304 when the client's copy (If-None-Match / If-Modified-Since) is still
+  # current, judged from page_state = (state, last_modified) without render()
+  if page_state is None or session.get('_flashes'):
+    return render()
+  state, last_modified = page_state
+  etag = hashlib.md5(repr((request.full_path, state)).encode()).hexdigest()
+  if last_modified is not None:
+    # stored as naive local time
+    last_modified = last_modified.astimezone(timezone.utc)
+
+  if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+    response = make_response(render())
+  else:
+    response = Response(status=304)
+  response.set_etag(etag)
+  response.last_modified = last_modified
+  # caches may keep the page but must revalidate it
+  response.cache_control.no_cache = True
+
+  return response
+
+def page_fragment(template, next_key, **context):
+  # next page of a listing for the "Load more" link in static/js/script.js
+  return jsonify(html=render_template(template, **context),
+                 next_cursor=encode_cursor(next_key))
+
 ###################################################################
 # Controllers.
 ###################################################################
@@ -64,35 +232,55 @@ def index():
 ###################################################################
 @app.route('/venues')
 def venues():
-  # TODO: replace with real venues data.
-  #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-  venue_list_by_city_state = Venue.query.distinct(Venue.city, Venue.state).all()
-  data = [venue.demo_venue_by_city_state() for venue in venue_list_by_city_state]
+  # one query: city/state -> venues -> num_upcoming_shows, narrowed by the
+  # facet filters, plus one for the facet counts
+  filters = parse_filters(request.args)
+  page_state = listing_state(Venue)
+
+  def render():
+    data, next_key = venue_directory(*page_request(VENUE_DIRECTORY_KEY), filter_criteria(Venue, filters))
+    return render_template('pages/venues.html', areas=data, next_cursor=encode_cursor(next_key),
+                           filters=filters, facets=facet_counts(Venue, filters, page_state))
+
+  return conditional_page(page_state, render)
 
-  return render_template('pages/venues.html', areas=data)
+@app.route('/venues/page')
+def venues_page():
+  def render():
+    data, next_key = venue_directory(*page_request(VENUE_DIRECTORY_KEY),
+                                     filter_criteria(Venue, parse_filters(request.args)))
+    return page_fragment('pages/_venue_areas.html', next_key, areas=data)
 
-@app.route('/venues/search', methods=['POST'])
+  return conditional_page(listing_state(Venue), render)
+
+@app.route('/venues/search', methods=['GET', 'POST'])
+@read_only
 def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # case-insensitive partial match on name, city, state and genres, ranked
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  search_term_input = request.form.get('search_term', '')
-  venue_list = Venue.query.filter(Venue.name.ilike("%{}%".format(search_term_input))).all()
-  response = {
-    "count": len(venue_list),
-    "data": [venue.demo_info_with_upcoming_show_number() for venue in venue_list] if len(venue_list) > 0 else []
-  }
+  search_term_input = request.values.get('search_term', '')
+  response = search(Venue, search_term_input, *search_page_request())
 
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_venues.html', results=response, search_term=search_term_input)
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  venue = Venue.query.filter(Venue.id == venue_id).first()
-  data = venue.demo_individual()
+  # one `now` for the validator and the upcoming/past split
+  now = datetime.now()
+
+  def render():
+    venue = Venue.query.options(*SCALAR_ONLY).filter(Venue.id == venue_id, visible(Venue)).first_or_404()
+    data = venue.demo_individual(now, app.config['SHOWS_PER_SECTION'], past_shows_request())
+    data['past_shows_cursor'] = encode_cursor(data.pop('past_shows_next'))
+    next_show_start = data.pop('next_show_start')
 
-  return render_template('pages/show_venue.html', venue=data)
+    return render_template('pages/show_venue.html', venue=data), next_show_start
+
+  page_state = detail_page_state(Venue, venue_id, now)
+  return conditional_page(page_state,
+                          lambda: cached_page(PageCache.key('venue', venue_id), page_state, render))
 
 # =================================================================
 # >>> Create Venue
@@ -147,7 +335,7 @@ def create_venue_submission():
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
   # TODO: populate form with values from venue with ID <venue_id>
-  venue = Venue.query.get(venue_id)
+  venue = Venue.query.options(*SCALAR_ONLY).get(venue_id)
   venue_info = venue.demo_info()
   form = VenueForm(data=venue_info)
 
@@ -160,20 +348,24 @@ def edit_venue_submission(venue_id):
   form = VenueForm(request.form)
   # if form.validate():
   try:
-    venue = Venue.query.filter(Venue.id == venue_id).one()
-    venue.name = form.name.data,
-    venue.city = form.city.data,
-    venue.state = form.state.data,
-    venue.address = form.address.data,
-    venue.phone = form.phone.data,
+    venue = Venue.query.options(*SCALAR_ONLY).filter(Venue.id == venue_id).one()
+    venue.name = form.name.data
+    venue.city = form.city.data
+    venue.state = form.state.data
+    venue.address = form.address.data
+    venue.phone = form.phone.data
     venue.genres = form.genres.data
-    venue.facebook_link = form.facebook_link.data,
-    venue.website = form.website_link.data,
-    venue.image_link = form.image_link.data,
+    venue.facebook_link = form.facebook_link.data
+    venue.website = form.website_link.data
+    venue.image_link = form.image_link.data
     venue.seeking_talent = form.seeking_talent.data
     venue.seeking_description = form.seeking_description.data
 
+    # artist pages show the venue's name and image on its shows
+    artist_ids = venue.artist_ids()
+    touch(Artist, artist_ids)
     db.session.commit()
+    pages_changed([venue_id], artist_ids)
     flash('Venue ' + request.form['name'] + ' was successfully updated!')
   except Exception as ex:
     db.session.rollback()
@@ -230,15 +422,26 @@ def delete_venue(venue_id):
   """
   try:
     venue = Venue.query.get_or_404(venue_id)
-    current_session = db.object_session(venue)
-    current_session.delete(venue)
-    current_session.commit()
-    # db.session.delete(venue)
-    # db.session.commit()
-    flash('The venue has been removed together with all of its shows.')
+    # current_session = db.object_session(venue)
+    # current_session.delete(venue)
+    # current_session.commit()
+    shows = venue.upcoming_shows_count + venue.past_shows_count
+    if venue.deleting_at is not None:
+      flash('The venue is already being removed.')
+    elif 0 < app.config['BACKGROUND_DELETE_SHOWS'] < shows:
+      if delete_in_background(Venue, venue_id, app.config['DELETE_BATCH_SIZE']):
+        flash('The venue and its {} shows are being removed in the background.'.format(shows))
+      else:
+        flash('The venue is already being removed.')
+    else:
+      venue.delete()
+      flash('The venue has been removed together with all of its shows.')
     return render_template('pages/home.html')
-  except ValueError:
+  except (SQLAlchemyError, RuntimeError) as ex:
+    # RuntimeError: the background thread could not be started; a delete
+    # already marked is left to `flask purge pending`
     db.session.rollback()
+    app.logger.error('deleting %s %s failed: %s', 'Venue', venue_id, ex)
     flash('It was not possible to delete this Venue')
   finally:
     db.session.close()
@@ -252,24 +455,35 @@ def delete_venue(venue_id):
 ###################################################################
 @app.route('/artists')
 def artists():
-  # TODO: replace with real data returned from querying the database
-  artist_list = Artist.query.all()
-  data = [artist.demo_info() for artist in artist_list]
-  return render_template('pages/artists.html', artists=data)
+  filters = parse_filters(request.args)
+  page_state = listing_state(Artist)
+
+  def render():
+    data, next_key = artist_directory(*page_request(ARTIST_DIRECTORY_KEY), filter_criteria(Artist, filters))
+    return render_template('pages/artists.html', artists=data, next_cursor=encode_cursor(next_key),
+                           filters=filters, facets=facet_counts(Artist, filters, page_state))
+
+  return conditional_page(page_state, render)
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/page')
+def artists_page():
+  def render():
+    data, next_key = artist_directory(*page_request(ARTIST_DIRECTORY_KEY),
+                                      filter_criteria(Artist, parse_filters(request.args)))
+    return page_fragment('pages/_artist_items.html', next_key, artists=data)
+
+  return conditional_page(listing_state(Artist), render)
+
+@app.route('/artists/search', methods=['GET', 'POST'])
+@read_only
 def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # case-insensitive partial match on name, city, state and genres, ranked
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  search_term_input = request.form.get('search_term', '')
-  artist_list = Artist.query.filter(Artist.name.ilike("%{}%".format(search_term_input))).all()
-  response = {
-    "count": len(artist_list),
-    "data": [artist.demo_individual() for artist in artist_list] if len(artist_list) > 0 else []
-  }
+  search_term_input = request.values.get('search_term', '')
+  response = search(Artist, search_term_input, *search_page_request())
 
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_artists.html', results=response, search_term=search_term_input)
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
@@ -298,17 +512,26 @@ def show_artist(artist_id):
   }
   """
   # shows the artist page with the given artist_id
-  # TODO: replace with real artist data from the artist table, using artist_id
-  artist = Artist.query.filter(Artist.id == artist_id).first()
-  data = artist.demo_individual()
+  # one `now` for the validator and the upcoming/past split
+  now = datetime.now()
 
-  return render_template('pages/show_artist.html', artist=data)
+  def render():
+    artist = Artist.query.options(*SCALAR_ONLY).filter(Artist.id == artist_id, visible(Artist)).first_or_404()
+    data = artist.demo_individual(now, app.config['SHOWS_PER_SECTION'], past_shows_request())
+    data['past_shows_cursor'] = encode_cursor(data.pop('past_shows_next'))
+    next_show_start = data.pop('next_show_start')
+
+    return render_template('pages/show_artist.html', artist=data), next_show_start
+
+  page_state = detail_page_state(Artist, artist_id, now)
+  return conditional_page(page_state,
+                          lambda: cached_page(PageCache.key('artist', artist_id), page_state, render))
 
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-  artist = Artist.query.get(artist_id)
+  artist = Artist.query.options(*SCALAR_ONLY).get(artist_id)
   artist_info = artist.demo_info()
   form = ArtistForm(data=artist_info)
 
@@ -320,18 +543,22 @@ def edit_artist_submission(artist_id):
   form = ArtistForm(request.form)
 
   try:
-    artist = Artist.query.filter_by(id=artist_id).one()
-    artist.name = form.name.data,
-    artist.city = form.city.data,
-    artist.state = form.state.data,
-    artist.phone = form.phone.data,
+    artist = Artist.query.options(*SCALAR_ONLY).filter_by(id=artist_id).one()
+    artist.name = form.name.data
+    artist.city = form.city.data
+    artist.state = form.state.data
+    artist.phone = form.phone.data
     artist.genres = form.genres.data
-    artist.facebook_link = form.facebook_link.data,
-    artist.image_link = form.image_link.data,
+    artist.facebook_link = form.facebook_link.data
+    artist.image_link = form.image_link.data
     artist.seeking_venue = form.seeking_venue.data
     artist.seeking_description = form.seeking_description.data
 
+    # venue pages show the artist's name and image on its shows
+    venue_ids = artist.venue_ids()
+    touch(Venue, venue_ids)
     db.session.commit()
+    pages_changed(venue_ids, [artist_id])
     flash('Artist ' + request.form['name'] + ' was successfully updated!')
   except Exception as ex:
     db.session.rollback()
@@ -424,12 +651,23 @@ def delete_artist(artist_id):
     # current_session = db.object_session(venue)
     # current_session.delete(venue)
     # current_session.commit()
-    db.session.delete(artist)
-    db.session.commit()
-    flash('The artist has been removed together with all of its shows.')
+    shows = artist.upcoming_shows_count + artist.past_shows_count
+    if artist.deleting_at is not None:
+      flash('The artist is already being removed.')
+    elif 0 < app.config['BACKGROUND_DELETE_SHOWS'] < shows:
+      if delete_in_background(Artist, artist_id, app.config['DELETE_BATCH_SIZE']):
+        flash('The artist and its {} shows are being removed in the background.'.format(shows))
+      else:
+        flash('The artist is already being removed.')
+    else:
+      artist.delete()
+      flash('The artist has been removed together with all of its shows.')
     return render_template('pages/home.html')
-  except ValueError:
+  except (SQLAlchemyError, RuntimeError) as ex:
+    # RuntimeError: the background thread could not be started; a delete
+    # already marked is left to `flask purge pending`
     db.session.rollback()
+    app.logger.error('deleting %s %s failed: %s', 'Artist', artist_id, ex)
     flash('It was not possible to delete this Artist')
   finally:
     db.session.close()
@@ -452,10 +690,21 @@ def shows():
     "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
     "start_time": "2019-05-21T21:30:00.000Z"
   """
-  show_list = Show.query.all()
-  data = [show.demo_info_with_venue_artist() for show in show_list]
+  def render():
+    data, next_key = show_feed(*page_request(SHOW_FEED_KEY))
+    return render_template('pages/shows.html', shows=data, next_cursor=encode_cursor(next_key))
+
+  # every show insert/delete bumps its venue and artist (show counters), so
+  # their state covers Show without counting the largest table
+  return conditional_page(listing_state(Venue, Artist), render)
+
+@app.route('/shows/page')
+def shows_page():
+  def render():
+    data, next_key = show_feed(*page_request(SHOW_FEED_KEY))
+    return page_fragment('pages/_show_tiles.html', next_key, shows=data)
 
-  return render_template('pages/shows.html', shows=data)
+  return conditional_page(listing_state(Venue, Artist), render)
 
 @app.route('/shows/create', methods=['GET'])
 def create_shows():
@@ -466,7 +715,7 @@ def create_shows():
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
   form = ShowForm(request.form)
-  if form.validate():
+  if form.validate() and booking_available(form):
     try:
       show = Show(
         artist_id=form.artist_id.data,
@@ -494,6 +743,58 @@ def create_show_submission():
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
+def booking_available(form):
+  # adds field errors to a valid ShowForm whose venue/artist does not exist or
+  # is booked at start_time; when it can be booked, the venue and artist rows
+  # stay locked until show.add() commits, so no other request takes the slot
+  ids = {}
+  for field in (form.venue_id, form.artist_id):
+    try:
+      ids[field.name] = int(field.data)
+    except (TypeError, ValueError):
+      field.errors.append('Not a valid ID')
+  if len(ids) < 2:
+    return False
+
+  errors = check_bookings([(ids['venue_id'], ids['artist_id'], form.start_time.data)], lock=True)[0]
+  if errors:
+    db.session.rollback()
+  for name, messages in errors.items():
+    form[name].errors.extend(messages)
+
+  return not errors
+
+#  Export
+#  ----------------------------------------------------------------
+def export_request():
+  # filters for export() from ?city=&state=&start=&end= (ISO 8601 times)
+  try:
+    start, end = (datetime.fromisoformat(request.args[name]) if request.args.get(name) else None
+                  for name in ('start', 'end'))
+  except ValueError:
+    abort(400)
+
+  return {'city': request.args.get('city'),
+          'state': request.args.get('state'),
+          'start': start,
+          'end': end}
+
+@app.route('/export/<kind>.<format>')
+def export_data(kind, format):
+  # streamed straight from a server-side cursor, see export.py
+  if kind not in EXPORT_COLUMNS or format not in FORMATS:
+    abort(404)
+  chunks = export(kind, format, **export_request())
+
+  return Response(stream_with_context(chunks),
+                  mimetype=FORMATS[format],
+                  headers={'Content-Disposition': 'attachment; filename={}.{}'.format(kind, format)})
+
+@app.route('/cache/stats')
+def cache_stats():
+  # hit/miss counters of the detail page and tile caches, for monitoring
+  return jsonify(dict(page_cache.stats(), fragments=fragment_cache.stats()))
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
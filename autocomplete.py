@@ -0,0 +1,304 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import heapq
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from itertools import accumulate
+from datetime import timedelta
+
+from flask import current_app
+
+from app import db
+from model import Venue, Artist
+from replicas import primary
+
+# changed rows kept outside the packed arrays before they are merged in
+OVERLAY_SIZE = 10000
+# how often a process reads names that other processes changed, as in matching.py
+REFRESH_SECONDS = 5
+REFRESH_OVERLAP = timedelta(seconds=60)
+MAX_SUGGESTIONS = 20
+LOAD_BATCH = 10000
+
+# ----------------------------------------------------------------------------#
+# Name autocomplete.
+# NameIndex suggests venues/artists whose name, or any word of it, starts
+# with what was typed (case-insensitive). Names are packed: all normalized
+# names in one string, all display names in another, with array offsets,
+# ids and interned city codes, so a row costs its characters twice plus a
+# few machine words instead of a handful of Python objects. The sorted
+# "entries" point at every word start in the normalized names (as row and
+# length to the end of the name), and a lookup is a bisect over them. Rows
+# changed since the arrays were packed sit in a small overlay (and are
+# hidden in the packed part) until OVERLAY_SIZE of them have piled up and
+# the arrays are packed again. Packing happens in a background thread and
+# outside the lock; lookups meanwhile serve the arrays they have (none
+# before the first packing), and the new arrays are swapped in under the
+# lock. Changes arrive through invalidate() (a page_change_hooks hook) and,
+# for other processes' writes, an updated_at check every REFRESH_SECONDS.
+# ----------------------------------------------------------------------------#
+def normalize(name):
+    return ' '.join((name or '').casefold().split())
+
+_WORD_START = re.compile(r'(?<=\W)\w')
+_PUNCTUATION = re.compile(r'[^\w ]')
+
+def word_starts(key):
+    # the name itself and every later word in it
+    if _PUNCTUATION.search(key) is None:
+        # the usual name: words split by single spaces (see normalize)
+        starts, space = [0], key.find(' ')
+        while space >= 0:
+            starts.append(space + 1)
+            space = key.find(' ', space + 1)
+        return starts
+    return [0] + [match.start() for match in _WORD_START.finditer(key)]
+
+def _pack(strings):
+    return ''.join(strings), array('I', accumulate(map(len, strings), initial=0))
+
+class _Entries:
+    # the sorted word suffixes of a _Packed, as a sequence for bisect
+    def __init__(self, packed):
+        self.packed = packed
+
+    def __len__(self):
+        return len(self.packed.owners)
+
+    def __getitem__(self, entry):
+        packed = self.packed
+        end = packed.key_offsets[packed.owners[entry] + 1]
+        return packed.keys[end - packed.lengths[entry]:end]
+
+class _Packed:
+    def __init__(self, rows, cities):
+        # rows: (id, name, city) in id order; cities: the index's shared
+        # list of city names, which city codes point into
+        codes = {city: code for code, city in enumerate(cities)}
+        ids, names, row_cities = list(zip(*rows)) or ((), (), ())
+        for city in row_cities:
+            if city not in codes:
+                codes[city] = len(cities)
+                cities.append(city)
+        self.ids = array('q', ids)
+        self.cities = array('I', [codes[city] for city in row_cities])
+        self.names, self.name_offsets = _pack(names)
+        keys = [normalize(name) for name in names]
+        self.keys, self.key_offsets = _pack(keys)
+        del ids, names, row_cities
+
+        # every word start of every name, sorted by the text from there on;
+        # an entry is its row and the length of that text
+        suffixes, owners = [], []
+        for row, key in enumerate(keys):
+            starts = word_starts(key)
+            suffixes += [key[start:] for start in starts]
+            owners += [row] * len(starts)
+        del keys
+        order = sorted(range(len(suffixes)), key=suffixes.__getitem__)
+        self.owners = array('I', map(owners.__getitem__, order))
+        self.lengths = array('I', map(len, map(suffixes.__getitem__, order)))
+        self.entries = _Entries(self)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, row, cities):
+        return (self.ids[row], self.names[self.name_offsets[row]:self.name_offsets[row + 1]],
+                cities[self.cities[row]])
+
+    def find(self, id):
+        # -> row of id, or None
+        row = bisect_left(self.ids, id)
+        return row if row < len(self.ids) and self.ids[row] == id else None
+
+    def matches(self, prefix):
+        # -> (suffix, row) of every entry starting with prefix, in order
+        entry = bisect_left(self.entries, prefix)
+        while entry < len(self.entries):
+            suffix = self.entries[entry]
+            if not suffix.startswith(prefix):
+                return
+            yield suffix, self.owners[entry]
+            entry += 1
+
+    def nbytes(self):
+        return (len(self.names) + len(self.keys) +
+                sum(column.itemsize * len(column) for column in
+                    (self.ids, self.cities, self.name_offsets, self.key_offsets, self.owners, self.lengths)))
+
+""" Format:
+    NAME_INDEXES['artists'].suggest('gun', 10) ->
+    [{"id": 4, "name": "Guns N Petals", "city": "San Francisco"}, ...]
+"""
+class NameIndex:
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.loaded = False
+        self._loading = False
+        self._cities = []
+        self._packed = _Packed((), self._cities)
+        # id -> (name, city) and sorted (suffix, id) entries of changed rows
+        self._overlay = {}
+        self._overlay_entries = []
+        # ids whose packed row is outdated or deleted
+        self._hidden = set()
+        self._dirty = set()
+        self._since = None
+        self._checked_at = 0
+
+    def invalidate(self, ids):
+        with self._lock:
+            self._dirty |= ids
+
+    def _select(self, *criteria):
+        model = self.model
+        return db.select(model.id, model.name, model.city).where(*criteria).order_by(model.id)
+
+    def load(self):
+        # without the lock: pack every row, streamed from the primary, then
+        # swap the new arrays in
+        with primary():
+            since = db.session.scalar(db.select(db.func.max(self.model.updated_at)))
+            rows = db.session.execute(self._select().execution_options(yield_per=LOAD_BATCH))
+            cities = []
+            packed = _Packed(((id, name, city) for id, name, city in rows), cities)
+        with self._lock:
+            # rows changed while packing may or may not be in the new arrays:
+            # look at them again, and at other processes' writes, on the next refresh
+            self._dirty |= set(self._overlay) | self._hidden
+            self._packed, self._cities = packed, cities
+            self._overlay, self._overlay_entries, self._hidden = {}, [], set()
+            self._since = max(self._since or since, since) if since is not None else self._since
+            self.loaded, self._loading, self._checked_at = True, False, 0
+
+    def load_in_background(self, app):
+        # with the lock held; at most one packing at a time
+        if self._loading:
+            return
+        self._loading = True
+
+        def load():
+            with app.app_context():
+                try:
+                    self.load()
+                except Exception:
+                    with self._lock:
+                        self._loading = False
+                    app.logger.exception('packing the %s name index failed', self.model.__tablename__)
+
+        threading.Thread(target=load, name='autocomplete-load-{}'.format(self.model.__tablename__),
+                         daemon=True).start()
+
+    def _current(self, id):
+        if id in self._overlay:
+            return self._overlay[id]
+        row = self._packed.find(id)
+        if row is None or id in self._hidden:
+            return None
+        return self._packed.row(row, self._cities)[1:]
+
+    def _remove(self, id):
+        if self._overlay.pop(id, None) is not None:
+            self._overlay_entries = [entry for entry in self._overlay_entries if entry[1] != id]
+        if self._packed.find(id) is not None:
+            self._hidden.add(id)
+
+    def _upsert(self, id, name, city):
+        if self._current(id) == (name, city):
+            return
+        self._remove(id)
+        self._overlay[id] = (name, city)
+        key = normalize(name)
+        for start in word_starts(key):
+            insort(self._overlay_entries, (key[start:], id))
+
+    def refresh(self):
+        # with the lock held; reads the primary, like the cache fills
+        if not self.loaded:
+            self.load_in_background(current_app._get_current_object())
+            return
+        with primary():
+            self._refresh()
+
+    def _refresh(self):
+        now = time.monotonic()
+        dirty, self._dirty = self._dirty, set()
+        criteria = [self.model.id.in_(dirty)] if dirty else []
+        if now >= self._checked_at + REFRESH_SECONDS:
+            self._checked_at = now
+            if self._since is not None:
+                criteria.append(self.model.updated_at >= self._since - REFRESH_OVERLAP)
+        if not criteria:
+            return
+
+        found = set()
+        for id, name, city, updated_at in db.session.execute(
+                self._select(db.or_(*criteria)).add_columns(self.model.updated_at)):
+            found.add(id)
+            self._since = max(self._since or updated_at, updated_at)
+            self._upsert(id, name, city)
+        for id in dirty - found:
+            self._remove(id)
+        if len(self._overlay) + len(self._hidden) > OVERLAY_SIZE:
+            self.load_in_background(current_app._get_current_object())
+
+    def _packed_matches(self, prefix):
+        packed, cities = self._packed, self._cities
+        for suffix, row in packed.matches(prefix):
+            if packed.ids[row] not in self._hidden:
+                yield (suffix,) + packed.row(row, cities)
+
+    def _overlay_matches(self, prefix):
+        for entry in range(bisect_left(self._overlay_entries, (prefix,)), len(self._overlay_entries)):
+            suffix, id = self._overlay_entries[entry]
+            if not suffix.startswith(prefix):
+                return
+            yield (suffix, id) + self._overlay[id]
+
+    def suggest(self, term, limit=10):
+        prefix = normalize(term)
+        if not prefix:
+            return []
+        suggestions, seen = [], set()
+        with self._lock:
+            self.refresh()
+            # names matching on more than one word come up once
+            for _, id, name, city in heapq.merge(self._packed_matches(prefix),
+                                                 self._overlay_matches(prefix)):
+                if id not in seen:
+                    seen.add(id)
+                    suggestions.append({'id': id, 'name': name, 'city': city})
+                    if len(suggestions) == limit:
+                        break
+        return suggestions
+
+    def stats(self):
+        with self._lock:
+            return {'rows': len(self._packed) - len(self._hidden) + len(self._overlay),
+                    'entries': len(self._packed.owners) + len(self._overlay_entries),
+                    'overlay': len(self._overlay),
+                    'packed_bytes': self._packed.nbytes()}
+
+NAME_INDEXES = {'venues': NameIndex(Venue), 'artists': NameIndex(Artist)}
+
+def names_changed(venue_ids, artist_ids):
+    # page_change_hooks hook: creates, edits and deletes (and show changes,
+    # which leave the names alone and cost one small query)
+    NAME_INDEXES['venues'].invalidate(venue_ids)
+    NAME_INDEXES['artists'].invalidate(artist_ids)
+
+def preload(app):
+    # start packing both indexes at startup rather than on the first
+    # keystroke (see wsgi.py)
+    for index in NAME_INDEXES.values():
+        with index._lock:
+            index.load_in_background(app)
@@ -0,0 +1,51 @@
+"""
+Autocomplete benchmark.
+
+Packs the venue and artist name indexes from the seeded database at
+DATABASE_URL, reports how long that took and how much memory the packed
+arrays use, then times suggestions for prefixes of random names, as the
+show form requests them keystroke by keystroke:
+
+    DATABASE_URL=postgresql://localhost/fyyur_bench python -m benchmarks.autocomplete --iterations 1000
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import argparse
+import random
+import time
+
+from app import app, db
+from autocomplete import NAME_INDEXES
+from benchmarks.stats import percentile
+
+def main():
+    parser = argparse.ArgumentParser(description='Time name autocomplete.')
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with app.app_context():
+        for kind, index in NAME_INDEXES.items():
+            started = time.perf_counter()
+            index.load()
+            stats = index.stats()
+            print('{:<8} packed {} names ({} entries) in {:.1f}s, {:.1f}MB'.format(
+                kind, stats['rows'], stats['entries'], time.perf_counter() - started, stats['packed_bytes'] / 1e6))
+
+            names = db.session.scalars(db.select(index.model.name).order_by(index.model.id).limit(10000)).all()
+            if not names:
+                continue
+            times = []
+            for _ in range(args.iterations):
+                name = rng.choice(names)
+                term = name[:rng.randint(1, min(len(name), 8))]
+                started = time.perf_counter()
+                index.suggest(term, args.limit)
+                times.append((time.perf_counter() - started) * 1000)
+            print('{:<8} suggest p50 {:8.3f}ms  p95 {:8.3f}ms  p99 {:8.3f}ms'.format(
+                kind, percentile(times, 50), percentile(times, 95), percentile(times, 99)))
+
+if __name__ == '__main__':
+    main()
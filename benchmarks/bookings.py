@@ -0,0 +1,98 @@
+"""
+Booking conflict check benchmark.
+
+Times bookings.check_bookings against the seeded database at DATABASE_URL:
+single proposals (as /shows/create checks them) and batches (as
+/api/v1/bookings/check takes them), and on PostgreSQL prints the plan of
+the overlap query, which should probe the (venue_id, start_time) and
+(artist_id, start_time) indexes rather than scan Show:
+
+    DATABASE_URL=postgresql://localhost/fyyur_bench python -m benchmarks.bookings --iterations 500
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import argparse
+import random
+import time
+from datetime import timedelta
+
+from app import app, db
+from model import Show
+from bookings import check_bookings
+from benchmarks.stats import percentile
+
+def proposals(rng, shows, count):
+    # half on top of an existing show (a conflict), half in an open slot far ahead
+    proposed = []
+    for _ in range(count):
+        venue_id, artist_id, start_time = rng.choice(shows)
+        if rng.random() < 0.5:
+            start_time += timedelta(minutes=rng.randrange(-60, 60))
+        else:
+            start_time += timedelta(days=3650 + rng.randrange(3650))
+        proposed.append((venue_id, artist_id, start_time))
+    return proposed
+
+def timed(function, iterations):
+    times = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - started) * 1000)
+        db.session.rollback()
+    return times
+
+def report(label, times, per=1):
+    print('{:<24} p50 {:8.2f}ms  p95 {:8.2f}ms  p99 {:8.2f}ms  ({:.3f}ms per show)'.format(
+        label, percentile(times, 50), percentile(times, 95), percentile(times, 99), percentile(times, 50) / per))
+
+def explain(proposal):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if 'proposed' in statement:
+            statements.append((statement, parameters))
+
+    db.event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        check_bookings([proposal])
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    with db.engine.connect() as conn:
+        for statement, parameters in statements:
+            print('\n'.join(row for row, in conn.exec_driver_sql('EXPLAIN ' + statement, parameters)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the booking conflict check.')
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--batch-sizes', default='100,1000', help='comma separated')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with app.app_context():
+        total = db.session.scalar(db.select(db.func.count()).select_from(Show))
+        shows = db.session.execute(db.select(Show.venue_id, Show.artist_id, Show.start_time).
+                                   order_by(Show.id).limit(10000)).all()
+        if not shows:
+            raise SystemExit('seed the database first (python -m benchmarks.seed)')
+        print('{} shows'.format(total))
+
+        singles = proposals(rng, shows, args.iterations)
+        conflicts = sum(bool(errors) for errors in check_bookings(singles))
+        db.session.rollback()
+        print('{} of {} proposals conflict'.format(conflicts, len(singles)))
+        singles = iter(singles)
+        report('single', timed(lambda: check_bookings([next(singles)]), args.iterations))
+        singles = iter(proposals(rng, shows, args.iterations))
+        report('single, locked', timed(lambda: check_bookings([next(singles)], lock=True), args.iterations))
+        for size in map(int, args.batch_sizes.split(',')):
+            batch = proposals(rng, shows, size)
+            report('batch of {}'.format(size), timed(lambda: check_bookings(batch), max(3, args.iterations // size)),
+                   per=size)
+
+        if db.engine.dialect.name == 'postgresql':
+            explain(shows[0])
+
+if __name__ == '__main__':
+    main()
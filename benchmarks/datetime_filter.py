@@ -0,0 +1,60 @@
+"""
+Microbenchmark for the `datetime` template filter: cost per show tile of the
+old strftime -> dateutil.parse -> babel.dates.format_datetime round trip
+against the cached-pattern filter in app.py, with and without the
+per-request memo.
+
+    python -m benchmarks.datetime_filter --tiles 1000 --distinct 200
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import argparse
+import random
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from app import app, format_datetime, DATETIME_FORMATS
+
+def before(start_time):
+    # what Show.demo_info() + the old filter did for every tile
+    value = start_time.strftime("%m/%d/%Y, %H:%M:%S")
+    return babel.dates.format_datetime(dateutil.parser.parse(value), DATETIME_FORMATS['full'], locale='en')
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-tile cost of the datetime filter.')
+    parser.add_argument('--tiles', type=int, default=1000, help='show tiles per page')
+    parser.add_argument('--distinct', type=int, default=200, help='distinct start times among them')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    now = datetime.now().replace(second=0, microsecond=0)
+    times = [now + timedelta(hours=rng.randint(0, 24 * 365)) for _ in range(args.distinct)]
+    tiles = [rng.choice(times) for _ in range(args.tiles)]
+    assert all(before(t) == format_datetime(t, 'full') for t in times[:50])
+
+    def page(filter_, memo):
+        def render():
+            app.config['DATETIME_FILTER_MEMO'] = memo
+            # one request context per page, like a real render
+            with app.test_request_context():
+                for start_time in tiles:
+                    filter_(start_time)
+        return render
+
+    cases = [('before: strftime + dateutil + format_datetime', page(before, False)),
+             ('after: cached Babel pattern', page(lambda t: format_datetime(t, 'full'), False)),
+             ('after: cached pattern + request memo', page(lambda t: format_datetime(t, 'full'), True))]
+    baseline = None
+    for name, render in cases:
+        best = min(timeit.repeat(render, number=1, repeat=args.repeat))
+        per_tile = best / args.tiles * 1e6
+        baseline = baseline or per_tile
+        print('{:<48} {:>8.2f} us/tile  {:>5.1f}x'.format(name, per_tile, baseline / per_tile))
+
+if __name__ == '__main__':
+    main()
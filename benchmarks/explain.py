@@ -0,0 +1,91 @@
+"""
+Query plan check.
+
+Drives every read route of benchmarks.run against the seeded PostgreSQL
+database at DATABASE_URL, runs EXPLAIN on each SELECT the routes issue and
+fails (exit status 1) if any plan sequentially scans a large table:
+
+    DATABASE_URL=postgresql://localhost/fyyur_bench python -m benchmarks.explain --min-rows 100000
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import argparse
+import random
+import sys
+
+from app import app, db, page_cache
+from benchmarks.run import routes, sample_targets
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+def read_routes(targets):
+    # GET routes plus the (read-only) search posts
+    rng = random.Random(0)
+    return [(name, method, path, data) for name, method, path, data in routes(rng, targets)
+            if method == 'GET' or name.startswith('search_')]
+
+def seq_scans(plan, large_tables):
+    # relation names of Seq Scan nodes anywhere in an EXPLAIN (FORMAT JSON) plan
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in large_tables:
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', ()):
+        found += seq_scans(child, large_tables)
+    return found
+
+def capture(client, engine, method, url, data):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+
+    db.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        (client.get if method == 'GET' else client.post)(url, data=data).get_data()
+    finally:
+        db.event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail if a route query seq-scans a large table.')
+    parser.add_argument('--min-rows', type=int, default=100000,
+                        help='tables with at least this many rows count as large')
+    args = parser.parse_args()
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    # run the detail page queries on every request
+    page_cache.ttl = 0
+    client = app.test_client()
+    failures = 0
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != 'postgresql':
+            sys.exit('benchmarks.explain needs PostgreSQL')
+        with engine.begin() as conn:
+            conn.exec_driver_sql('ANALYZE')
+            sizes = dict(conn.exec_driver_sql(
+                'SELECT relname, reltuples FROM pg_class WHERE relname IN %(tables)s', {'tables': TABLES}).all())
+        large_tables = {table for table, rows in sizes.items() if rows >= args.min_rows}
+        print('large tables:', ', '.join(sorted(large_tables)) or 'none')
+        targets = sample_targets(random.Random(0))
+
+    for name, method, path, data in read_routes(targets):
+        statements = capture(client, engine, method, path(), data() if data else None)
+        with engine.connect() as conn:
+            scans = []
+            for statement, parameters in statements:
+                plan = conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+                found = seq_scans(plan[0]['Plan'], large_tables)
+                if found:
+                    scans.append((found, statement))
+        failures += len(scans)
+        print('{:<22} {:>3} statements  {}'.format(name, len(statements), 'FAIL' if scans else 'ok'))
+        for found, statement in scans:
+            print('    seq scan on {}:\n    {}'.format(', '.join(found), ' '.join(statement.split())))
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
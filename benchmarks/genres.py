@@ -0,0 +1,53 @@
+"""
+Genre mask benchmark.
+
+Times the genres.py operations over the genre masks of every venue and
+artist in the database at DATABASE_URL (or --rows random ones when it is
+empty), with NumPy when it is installed and the pure Python fallback
+otherwise:
+
+    DATABASE_URL=postgresql://localhost/fyyur_bench python -m benchmarks.genres --iterations 200
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import argparse
+import random
+import time
+
+from app import app, db
+from model import Venue, Artist
+from benchmarks.stats import percentile
+import genres
+
+def timed(function, iterations):
+    times = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description='Time genre mask filtering and overlap.')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=100000, help='random masks when the database is empty')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with app.app_context():
+        masks = [mask for model in (Venue, Artist) for mask in db.session.scalars(db.select(model.genre_mask))]
+    if not masks:
+        masks = [genres.encode_genres(rng.sample(genres.GENRES, rng.randint(1, 3))) for _ in range(args.rows)]
+    masks = genres.mask_array(masks)
+    print('{} masks, {}'.format(len(masks), 'numpy' if genres.numpy is not None else 'pure python'))
+
+    wanted = [rng.sample(genres.GENRES, 2) for _ in range(args.iterations)]
+    for label, operation in (('contains_all', genres.contains_all), ('contains_any', genres.contains_any),
+                             ('overlap', genres.overlap)):
+        queries = iter(wanted)
+        times = timed(lambda: operation(masks, next(queries)), args.iterations)
+        print('{:<16} p50 {:8.3f}ms  p95 {:8.3f}ms'.format(label, percentile(times, 50), percentile(times, 95)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Load test for the production serving profile.
+
+Hammers a running server with concurrent clients while sampling the number
+of Postgres connections the app holds, and fails (exit status 1) if that
+number exceeds the configured budget or keeps growing:
+
+    FYYUR_ENV=production SECRET_KEY=x WEB_CONCURRENCY=4 DB_MAX_CONNECTIONS=20 \\
+        gunicorn -c gunicorn.conf.py wsgi:app &
+    DATABASE_URL=postgresql://localhost/fyyur_bench \\
+        python -m benchmarks.load --url http://localhost:8000 --concurrency 200 --duration 60 --budget 20
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import sqlalchemy as sa
+from sqlalchemy.pool import NullPool
+
+from benchmarks.stats import percentile
+
+APPLICATION_NAME = 'fyyur'
+
+def sample_paths(engine):
+    # -> functions of an rng returning a path to request
+    with engine.connect() as conn:
+        venue_ids = [id for id, in conn.execute(sa.text('SELECT id FROM "Venue" ORDER BY random() LIMIT 200'))]
+        artist_ids = [id for id, in conn.execute(sa.text('SELECT id FROM "Artist" ORDER BY random() LIMIT 200'))]
+    paths = [lambda rng: '/', lambda rng: '/venues', lambda rng: '/artists', lambda rng: '/shows',
+             lambda rng: '/api/v1/venues?fields=id,name', lambda rng: '/api/v1/shows']
+    if venue_ids:
+        paths += [lambda rng: '/venues/{}'.format(rng.choice(venue_ids)),
+                  lambda rng: '/api/v1/venues/{}'.format(rng.choice(venue_ids))]
+    if artist_ids:
+        paths.append(lambda rng: '/artists/{}'.format(rng.choice(artist_ids)))
+    return paths
+
+def count_connections(conn):
+    # the app's connections (config.py tags them with application_name)
+    return conn.execute(sa.text('SELECT count(*) FROM pg_stat_activity '
+                                'WHERE datname = current_database() AND application_name = :name'),
+                        {'name': APPLICATION_NAME}).scalar()
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent load with connection count sampling.')
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--concurrency', type=int, default=100, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--budget', type=int, required=True,
+                        help='most connections the app may hold (e.g. DB_MAX_CONNECTIONS)')
+    args = parser.parse_args()
+
+    engine = sa.create_engine(os.environ['DATABASE_URL'], poolclass=NullPool)
+    paths = sample_paths(engine)
+    deadline = time.monotonic() + args.duration
+    latencies, errors, connections = [], [], []
+    lock = threading.Lock()
+
+    def client(rng):
+        # each client has its own rng, seeded by its number
+        while time.monotonic() < deadline:
+            path = rng.choice(paths)(rng)
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(args.url + path, timeout=30) as response:
+                    response.read()
+            except (urllib.error.URLError, OSError) as ex:
+                with lock:
+                    errors.append('{} {}'.format(path, ex))
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    def sampler():
+        with engine.connect() as conn:
+            while time.monotonic() < deadline:
+                connections.append(count_connections(conn))
+                time.sleep(0.5)
+
+    threads = [threading.Thread(target=sampler)] + [threading.Thread(target=client, args=(random.Random(i),))
+                                                   for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if not latencies or not connections:
+        sys.exit('no requests completed')
+    half = len(connections) // 2
+    growing = half and max(connections[half:]) > max(connections[:half])
+    print('{} requests, {:.0f} req/s, {} errors'.format(len(latencies), len(latencies) / args.duration, len(errors)))
+    print('latency p50 {:.1f}ms  p95 {:.1f}ms  p99 {:.1f}ms'.format(
+        percentile(latencies, 50), percentile(latencies, 95), percentile(latencies, 99)))
+    print('app connections min {} max {} last {} (budget {}){}'.format(
+        min(connections), max(connections), connections[-1], args.budget,
+        ', still growing in the second half' if growing else ''))
+    for error in errors[:10]:
+        print('  ' + error)
+
+    sys.exit(1 if max(connections) > args.budget or growing else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Matchmaking benchmark.
+
+Times matching.match_artists for random venues of the seeded database at
+DATABASE_URL: the first call, which loads the artist matrix, then warm
+calls, with NumPy when it is installed and the pure Python fallback
+otherwise:
+
+    DATABASE_URL=postgresql://localhost/fyyur_bench python -m benchmarks.matching --iterations 200
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import argparse
+import random
+import time
+
+from app import app, db
+from model import Venue
+from matching import artist_matrix, match_artists
+from benchmarks.stats import percentile
+import genres
+
+def main():
+    parser = argparse.ArgumentParser(description='Time artist matchmaking for venues.')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with app.app_context():
+        venues = db.session.execute(db.select(Venue.id, Venue.genres, Venue.genre_mask, Venue.city, Venue.state).
+                                    order_by(Venue.id).limit(10000)).all()
+        if not venues:
+            raise SystemExit('seed the database first (python -m benchmarks.seed)')
+
+        started = time.perf_counter()
+        match_artists(rng.choice(venues), args.limit)
+        print('{} artists seeking venues, {}; first match (loads the matrix) {:.0f}ms'.format(
+            len(artist_matrix), 'numpy' if genres.numpy is not None else 'pure python',
+            (time.perf_counter() - started) * 1000))
+
+        times = []
+        for _ in range(args.iterations):
+            venue = rng.choice(venues)
+            started = time.perf_counter()
+            match_artists(venue, args.limit)
+            times.append((time.perf_counter() - started) * 1000)
+        print('match top {:<6} p50 {:8.2f}ms  p95 {:8.2f}ms  p99 {:8.2f}ms'.format(
+            args.limit, percentile(times, 50), percentile(times, 95), percentile(times, 99)))
+
+if __name__ == '__main__':
+    main()
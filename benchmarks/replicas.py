@@ -0,0 +1,101 @@
+"""
+Read replica routing check.
+
+Drives the app through the Flask test client with DATABASE_REPLICA_URLS set
+and counts the statements each engine runs, failing (exit status 1) unless
+read-only requests run on the replicas, writes run on the primary, reads
+stick to the primary after a write and fall back to it when no replica is
+up. A copy of the seeded database is enough of a replica for this:
+
+    createdb -T fyyur_bench fyyur_replica
+    DATABASE_URL=postgresql://localhost/fyyur_bench \\
+    DATABASE_REPLICA_URLS=postgresql://localhost/fyyur_replica \\
+        python -m benchmarks.replicas
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import os
+import sys
+import time
+
+os.environ.setdefault('REPLICA_STICKY_SECONDS', '1')
+
+from app import app, db
+from model import Artist
+
+failures = []
+
+def statements_by_engine(client, engines, method, url, data=None):
+    # engines: 'primary' / bind key -> engine
+    counts = {}
+    listeners = []
+    for name, engine in engines.items():
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany, name=name):
+            counts[name] = counts.get(name, 0) + 1
+        db.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        listeners.append((engine, before_cursor_execute))
+    try:
+        response = (client.get if method == 'GET' else client.post)(url, data=data)
+        response.get_data()
+    finally:
+        for engine, listener in listeners:
+            db.event.remove(engine, 'before_cursor_execute', listener)
+    return response.status_code, counts
+
+def check(label, counts, expected):
+    # expected: 'primary' or 'replica' (any replica_* bind)
+    ok = bool(counts) and all((name == 'primary') == (expected == 'primary') for name in counts)
+    print('{:<44} {:<8} {}'.format(label, 'ok' if ok else 'FAIL', counts))
+    if not ok:
+        failures.append(label)
+
+def edit_form(artist):
+    return {'name': artist.name, 'city': artist.city, 'state': artist.state, 'phone': artist.phone or '',
+            'genres': artist.genres or [], 'image_link': artist.image_link or '',
+            'facebook_link': artist.facebook_link or '', 'website_link': artist.website or '',
+            'seeking_venue': 'y' if artist.seeking_venue else '',
+            'seeking_description': artist.seeking_description or ''}
+
+def main():
+    app.config['WTF_CSRF_ENABLED'] = False
+    router = app.extensions['replicas']
+    if not router.keys:
+        sys.exit('set DATABASE_REPLICA_URLS')
+    with app.app_context():
+        artist = Artist.query.order_by(Artist.id).first()
+        if artist is None:
+            sys.exit('seed the database first (python -m benchmarks.seed)')
+        artist_id, form = artist.id, edit_form(artist)
+        engines = {key or 'primary': engine for key, engine in db.engines.items()}
+
+    client = app.test_client()
+    # ?page= keeps the detail page out of page_cache, whose fills read the primary
+    for label, method, url, data in [('GET /venues', 'GET', '/venues', None),
+                                     ('GET /artists/<id>', 'GET', '/artists/{}?page=1'.format(artist_id), None),
+                                     ('GET /api/v1/shows', 'GET', '/api/v1/shows', None),
+                                     ('POST /artists/search (read only)', 'POST', '/artists/search',
+                                      {'search_term': 'a'})]:
+        check(label, statements_by_engine(client, engines, method, url, data)[1], 'replica')
+
+    served = {statements_by_engine(client, engines, 'GET', '/api/v1/venues')[1].popitem()[0] for _ in router.keys}
+    print('{:<44} {:<8} {}'.format('round robin', 'ok' if len(served) == len(router.keys) else 'FAIL', sorted(served)))
+    if len(served) != len(router.keys):
+        failures.append('round robin')
+
+    status, counts = statements_by_engine(client, engines, 'POST', '/artists/{}/edit'.format(artist_id), form)
+    check('POST /artists/<id>/edit ({})'.format(status), counts, 'primary')
+    check('GET /artists/<id> right after the edit',
+          statements_by_engine(client, engines, 'GET', '/artists/{}?page=1'.format(artist_id))[1], 'primary')
+    time.sleep(app.config['REPLICA_STICKY_SECONDS'] + 0.1)
+    check('GET /artists/<id> after the sticky window',
+          statements_by_engine(client, engines, 'GET', '/artists/{}?page=1'.format(artist_id))[1], 'replica')
+
+    for key in router.keys:
+        router.mark_down(key)
+    check('GET /venues with every replica down', statements_by_engine(client, engines, 'GET', '/venues')[1], 'primary')
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
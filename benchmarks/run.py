@@ -0,0 +1,245 @@
+"""
+Route benchmarks.
+
+Drives every route in app.py through the Flask test client against the
+database at DATABASE_URL (seed it first with benchmarks.seed) and reports
+per route p50/p95/p99 latency, SQL statements per request and peak Python
+memory for one request. Results are saved as JSON so runs can be compared
+across commits:
+
+    DATABASE_URL=postgresql://localhost/fyyur_bench python -m benchmarks.run --iterations 50
+    python -m benchmarks.run --compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import instrumentation
+from app import app, db, page_cache, fragment_cache
+from model import Venue, Artist, Show
+from queries import encode_cursor
+from benchmarks.stats import percentile
+from forms import LEGAL_STATE_NAME, LEGAL_GENRE_NAME
+from benchmarks.seed import counts, venue_rows, artist_rows, bulk_insert, CITIES
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+SEARCH_TERMS = ['blue', 'hall', 'band', 'jazz', 'san francisco', 'echo quartet', 'x']
+
+# ----------------------------------------------------------------------------#
+# Routes.
+# (name, method, path(), form data() or None); the write routes edit and
+# delete rows the benchmark created itself.
+# ----------------------------------------------------------------------------#
+def facet_query(rng):
+    # one or two genres, half the time within one state
+    args = [('genre', genre) for genre, _ in rng.sample(LEGAL_GENRE_NAME, rng.randint(1, 2))]
+    if rng.random() < 0.5:
+        args.append(('state', rng.choice(LEGAL_STATE_NAME)[0]))
+    return urlencode(args)
+
+def routes(rng, targets):
+    venue = lambda: rng.choice(targets['venue_ids'])
+    artist = lambda: rng.choice(targets['artist_ids'])
+    venue_form = lambda: {'name': 'Bench Venue', 'city': rng.choice(CITIES), 'state': 'CA',
+                          'address': '1 Bench Street', 'genres': 'Jazz',
+                          'facebook_link': 'https://www.facebook.com/bench'}
+    artist_form = lambda: {'name': 'Bench Artist', 'city': rng.choice(CITIES), 'state': 'CA',
+                           'genres': 'Jazz', 'facebook_link': 'https://www.facebook.com/bench'}
+    show_form = lambda: {'venue_id': venue(), 'artist_id': artist(),
+                         'start_time': (datetime.now() + timedelta(days=rng.randint(1, 300))).strftime('%Y-%m-%d %H:%M:%S')}
+
+    return [
+        ('index', 'GET', lambda: '/', None),
+        ('venues', 'GET', lambda: '/venues', None),
+        ('venues_facets', 'GET', lambda: '/venues?' + facet_query(rng), None),
+        ('venues_page', 'GET', lambda: '/venues/page?cursor=' + rng.choice(targets['venue_cursors']), None),
+        ('search_venues', 'POST', lambda: '/venues/search', lambda: {'search_term': rng.choice(SEARCH_TERMS)}),
+        ('show_venue', 'GET', lambda: '/venues/{}'.format(venue()), None),
+        ('create_venue_form', 'GET', lambda: '/venues/create', None),
+        ('edit_venue', 'GET', lambda: '/venues/{}/edit'.format(venue()), None),
+        ('artists', 'GET', lambda: '/artists', None),
+        ('artists_facets', 'GET', lambda: '/artists?' + facet_query(rng), None),
+        ('artists_page', 'GET', lambda: '/artists/page?cursor=' + rng.choice(targets['artist_cursors']), None),
+        ('search_artists', 'POST', lambda: '/artists/search', lambda: {'search_term': rng.choice(SEARCH_TERMS)}),
+        ('show_artist', 'GET', lambda: '/artists/{}'.format(artist()), None),
+        ('create_artist_form', 'GET', lambda: '/artists/create', None),
+        ('edit_artist', 'GET', lambda: '/artists/{}/edit'.format(artist()), None),
+        ('shows', 'GET', lambda: '/shows', None),
+        ('shows_page', 'GET', lambda: '/shows/page?cursor=' + rng.choice(targets['show_cursors']), None),
+        ('create_shows', 'GET', lambda: '/shows/create', None),
+        ('api_venues', 'GET', lambda: '/api/v1/venues?fields=id,name,city,state', None),
+        ('api_venue', 'GET', lambda: '/api/v1/venues/{}'.format(venue()), None),
+        ('api_artists', 'GET', lambda: '/api/v1/artists', None),
+        ('api_shows', 'GET', lambda: '/api/v1/shows?venue_id={}'.format(venue()), None),
+        ('create_venue_submission', 'POST', lambda: '/venues/create', venue_form),
+        ('create_artist_submission', 'POST', lambda: '/artists/create', artist_form),
+        ('create_show_submission', 'POST', lambda: '/shows/create', show_form),
+        ('edit_venue_submission', 'POST', lambda: '/venues/{}/edit'.format(targets['own_venue_ids'][-1]), venue_form),
+        ('edit_artist_submission', 'POST', lambda: '/artists/{}/edit'.format(targets['own_artist_ids'][-1]), artist_form),
+        ('delete_venue', 'POST', lambda: '/venues/{}/delete'.format(targets['own_venue_ids'].pop()), None),
+        ('delete_artist', 'POST', lambda: '/artists/{}/delete'.format(targets['own_artist_ids'].pop()), None),
+    ]
+
+def sample_targets(rng):
+    # ids and deep-page cursors sampled from the seeded data
+    sample = lambda column, n=200: [row[0] for row in db.session.query(column).order_by(db.func.random()).limit(n)]
+    venue_keys = db.session.query(Venue.state, Venue.city, Venue.name, Venue.id).order_by(db.func.random()).limit(50).all()
+    artist_keys = db.session.query(Artist.name, Artist.id).order_by(db.func.random()).limit(50).all()
+    show_keys = db.session.query(Show.start_time, Show.id).order_by(db.func.random()).limit(50).all()
+
+    return {'venue_ids': sample(Venue.id),
+            'artist_ids': sample(Artist.id),
+            'venue_cursors': [encode_cursor(tuple(key)) for key in venue_keys] or [''],
+            'artist_cursors': [encode_cursor(tuple(key)) for key in artist_keys] or [''],
+            'show_cursors': [encode_cursor(tuple(key)) for key in show_keys] or [''],
+            'own_venue_ids': [],
+            'own_artist_ids': []}
+
+def prepare_targets(rng, iterations):
+    # sample_targets() plus rows of our own for the edit/delete routes (one
+    # per request, +1 for the memory pass)
+    targets = sample_targets(rng)
+    own = iterations + 2
+    before = {'venue': db.session.query(db.func.max(Venue.id)).scalar() or 0,
+              'artist': db.session.query(db.func.max(Artist.id)).scalar() or 0}
+    bulk_insert(Venue, venue_rows(rng, own))
+    bulk_insert(Artist, artist_rows(rng, own))
+    targets['own_venue_ids'] = [id for id, in db.session.query(Venue.id).filter(Venue.id > before['venue'])]
+    targets['own_artist_ids'] = [id for id, in db.session.query(Artist.id).filter(Artist.id > before['artist'])]
+
+    return targets
+
+# ----------------------------------------------------------------------------#
+# Measurement.
+# ----------------------------------------------------------------------------#
+def benchmark(iterations, only=None, random_seed=0):
+    rng = random.Random(random_seed)
+    statements, render_times = [], []
+
+    @app.after_request
+    def capture_statements(response):
+        stats = instrumentation.current_stats()
+        statements.append(stats.statements if stats else None)
+        render_times.append(stats.render_time * 1000 if stats else None)
+        return response
+
+    client = app.test_client()
+    with app.app_context():
+        targets = prepare_targets(rng, iterations)
+        volumes = counts()
+        dialect = db.engine.dialect.name
+
+    results = {}
+    for name, method, path, data in routes(rng, targets):
+        if only and name not in only:
+            continue
+        open_route = client.get if method == 'GET' else client.post
+
+        latencies, queries, renders, statuses = [], [], [], set()
+        for _ in range(iterations):
+            url, form = path(), data() if data else None
+            statements.clear()
+            render_times.clear()
+            started = time.perf_counter()
+            response = open_route(url, data=form)
+            response.get_data()
+            latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(statements[-1] if statements else None)
+            renders.append(render_times[-1] if render_times else None)
+            statuses.add(response.status_code)
+
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        url, form = path(), data() if data else None
+        open_route(url, data=form).get_data()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        counted = [q for q in queries if q is not None]
+        rendered = [r for r in renders if r is not None]
+        results[name] = {'p50_ms': round(percentile(latencies, 50), 2),
+                         'p95_ms': round(percentile(latencies, 95), 2),
+                         'p99_ms': round(percentile(latencies, 99), 2),
+                         'mean_ms': round(sum(latencies) / len(latencies), 2),
+                         'queries_per_request': round(sum(counted) / len(counted), 2) if counted else None,
+                         'max_queries': max(counted) if counted else None,
+                         'render_p50_ms': round(percentile(rendered, 50), 2) if rendered else None,
+                         'peak_memory_kb': round(peak / 1024, 1),
+                         'status': sorted(statuses)}
+        print('{:<26} p50 {:>8.2f}ms  p95 {:>8.2f}ms  p99 {:>8.2f}ms  render {:>7}ms  {:>6} q/req  {:>9.1f} KiB  {}'.format(
+            name, results[name]['p50_ms'], results[name]['p95_ms'], results[name]['p99_ms'],
+            results[name]['render_p50_ms'], results[name]['queries_per_request'],
+            results[name]['peak_memory_kb'], results[name]['status']))
+
+    return {'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'database': dialect,
+            'volumes': volumes,
+            'iterations': iterations,
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'routes': results}
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print('{} ({}) -> {} ({})'.format(old['commit'], old['volumes'], new['commit'], new['volumes']))
+    for name, after in new['routes'].items():
+        before = old['routes'].get(name)
+        if before is None:
+            print('{:<26} new'.format(name))
+            continue
+        change = (after['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+        print('{:<26} p95 {:>8.2f} -> {:>8.2f}ms ({:+.0f}%)  render p50 {} -> {}ms  q/req {} -> {}'.format(
+            name, before['p95_ms'], after['p95_ms'], change,
+            before.get('render_p50_ms'), after.get('render_p50_ms'),
+            before['queries_per_request'], after['queries_per_request']))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every route of the app.')
+    parser.add_argument('--iterations', type=int, default=50, help='requests per route')
+    parser.add_argument('--routes', nargs='*', help='only these endpoints')
+    parser.add_argument('--no-page-cache', action='store_true', help='render detail pages on every request')
+    parser.add_argument('--no-fragment-cache', action='store_true', help='render every list tile on every request')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # the benchmark posts forms without CSRF tokens
+    app.config['WTF_CSRF_ENABLED'] = False
+    if args.no_page_cache:
+        page_cache.ttl = 0
+    if args.no_fragment_cache:
+        fragment_cache.ttl = 0
+    result = benchmark(args.iterations, args.routes)
+
+    output = args.output or os.path.join(RESULTS_DIR, '{}-{}.json'.format(
+        datetime.now().strftime('%Y%m%d-%H%M%S'), result['commit']))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print('saved', output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Synthetic data generator for the benchmarks.
+
+Bulk-inserts venues, artists and shows into the database at DATABASE_URL,
+in batches of multi-row INSERTs. Point it at a throwaway database:
+
+    createdb fyyur_bench
+    DATABASE_URL=postgresql://localhost/fyyur_bench \\
+        python -m benchmarks.seed --reset --venues 10000 --artists 50000 --shows 1000000
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from flask_migrate import upgrade
+
+from app import app, db
+from model import Venue, Artist, Show, rebuild_show_counters
+from forms import LEGAL_STATE_NAME, LEGAL_GENRE_NAME
+
+BATCH_SIZE = 10000
+
+CITIES = ['San Francisco', 'New York', 'Chicago', 'Austin', 'Seattle', 'Denver',
+          'Nashville', 'Boston', 'Portland', 'Atlanta', 'Miami', 'Detroit',
+          'Los Angeles', 'New Orleans', 'Minneapolis', 'Philadelphia']
+WORDS = ['Blue', 'Velvet', 'Electric', 'Wild', 'Golden', 'Hidden', 'Midnight', 'Iron',
+         'Silver', 'Red', 'Lucky', 'Broken', 'Sonic', 'Neon', 'Quiet', 'Echo']
+VENUE_KINDS = ['Hall', 'Lounge', 'Club', 'Theatre', 'Room', 'Arena', 'Bar', 'Garden']
+ARTIST_KINDS = ['Band', 'Quartet', 'Collective', 'Trio', 'Project', 'Orchestra', 'Duo', 'Crew']
+
+# ----------------------------------------------------------------------------#
+# Generators.
+# ----------------------------------------------------------------------------#
+def _name(rng, kinds, i):
+    return '{} {} {} {}'.format(rng.choice(WORDS), rng.choice(WORDS), rng.choice(kinds), i)
+
+def _genres(rng):
+    return [genre for genre, _ in rng.sample(LEGAL_GENRE_NAME, rng.randint(1, 3))]
+
+def venue_rows(rng, count):
+    for i in range(count):
+        yield {'name': _name(rng, VENUE_KINDS, i),
+               'city': rng.choice(CITIES),
+               'state': rng.choice(LEGAL_STATE_NAME)[0],
+               'address': '{} Main Street'.format(rng.randint(1, 9999)),
+               'phone': '555-{:03d}-{:04d}'.format(rng.randint(0, 999), rng.randint(0, 9999)),
+               'genres': _genres(rng),
+               'image_link': 'https://example.com/venues/{}.jpg'.format(i),
+               'facebook_link': 'https://www.facebook.com/venue{}'.format(i),
+               'website': 'https://venue{}.example.com'.format(i),
+               'seeking_talent': rng.random() < 0.3,
+               'seeking_description': 'Looking for local acts'}
+
+def artist_rows(rng, count):
+    for i in range(count):
+        yield {'name': _name(rng, ARTIST_KINDS, i),
+               'city': rng.choice(CITIES),
+               'state': rng.choice(LEGAL_STATE_NAME)[0],
+               'phone': '555-{:03d}-{:04d}'.format(rng.randint(0, 999), rng.randint(0, 9999)),
+               'genres': _genres(rng),
+               'image_link': 'https://example.com/artists/{}.jpg'.format(i),
+               'facebook_link': 'https://www.facebook.com/artist{}'.format(i),
+               'website': 'https://artist{}.example.com'.format(i),
+               'seeking_venue': rng.random() < 0.3,
+               'seeking_description': 'Touring this year'}
+
+def show_rows(rng, count, venue_ids, artist_ids, now):
+    # three years of history, one year ahead
+    for _ in range(count):
+        yield {'venue_id': rng.choice(venue_ids),
+               'artist_id': rng.choice(artist_ids),
+               'start_time': now + timedelta(minutes=rng.randint(-3 * 365 * 24 * 60, 365 * 24 * 60))}
+
+# ----------------------------------------------------------------------------#
+# Bulk insert.
+# ----------------------------------------------------------------------------#
+def bulk_insert(model, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            db.session.execute(db.insert(model), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(db.insert(model), batch)
+        db.session.commit()
+
+def reset():
+    # drop everything and rebuild the schema through the migrations
+    db.drop_all()
+    db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+    db.session.commit()
+    upgrade()
+
+def seed(venues, artists, shows, random_seed=0, now=None):
+    rng = random.Random(random_seed)
+    now = now or datetime.now()
+
+    bulk_insert(Venue, venue_rows(rng, venues))
+    bulk_insert(Artist, artist_rows(rng, artists))
+    venue_ids = [id for id, in db.session.query(Venue.id)]
+    artist_ids = [id for id, in db.session.query(Artist.id)]
+    if venue_ids and artist_ids:
+        bulk_insert(Show, show_rows(rng, shows, venue_ids, artist_ids, now))
+    # bulk inserts bypass Show.add(), so count once at the end
+    rebuild_show_counters(BATCH_SIZE, now)
+
+def counts():
+    return {'venues': db.session.query(db.func.count(Venue.id)).scalar(),
+            'artists': db.session.query(db.func.count(Artist.id)).scalar(),
+            'shows': db.session.query(db.func.count(Show.id)).scalar()}
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed synthetic venues, artists and shows.')
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--artists', type=int, default=50000)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--reset', action='store_true', help='drop and re-migrate the schema first')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.reset:
+            reset()
+        started = time.perf_counter()
+        seed(args.venues, args.artists, args.shows, args.seed)
+        print('seeded {} in {:.1f}s'.format(counts(), time.perf_counter() - started))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+"""
+Helpers shared by the benchmarks, free of app imports so that
+benchmarks.load can use them without loading the Flask app.
+"""
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
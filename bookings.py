@@ -0,0 +1,104 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+from collections import defaultdict
+from datetime import timedelta
+from functools import lru_cache
+
+from flask import current_app
+
+from app import db
+from model import Venue, Artist, Show
+
+# proposals per statement (SQLite allows 500 selects in a UNION ALL)
+CHECK_CHUNK = 500
+
+# ----------------------------------------------------------------------------#
+# Booking conflicts.
+# A show holds its venue and its artist for SHOW_LENGTH_MINUTES from
+# start_time, so two shows of a venue (or an artist) overlap exactly when
+# their start times are closer than one show length. That makes the overlap
+# test a range scan on the (venue_id, start_time) and (artist_id, start_time)
+# indexes of migration b7c2e5a1d930: one index probe per proposal, however
+# long the show history is. A batch of proposals is checked with one
+# statement per chunk of CHECK_CHUNK, and against each other in memory.
+# With lock=True the venue and artist rows are locked (FOR UPDATE) until the
+# transaction ends, so two requests cannot book the same slot at once.
+# ----------------------------------------------------------------------------#
+""" Format:
+    check_bookings([(venue_id, artist_id, start_time), ...]) ->
+    [{}, {'venue_id': ['Venue 3 is booked from 2026-05-01 20:00 (show 1234)']}, ...]
+    one dict of field errors per proposal, empty when it can be booked
+"""
+def check_bookings(proposals, lock=False, length=None):
+    if length is None:
+        length = timedelta(minutes=current_app.config['SHOW_LENGTH_MINUTES'])
+    errors = [defaultdict(list) for _ in proposals]
+
+    for field, model in (('venue_id', Venue), ('artist_id', Artist)):
+        keys = [proposal[0 if field == 'venue_id' else 1] for proposal in proposals]
+        missing = set(keys) - _existing_ids(model, set(keys), lock)
+        booked = _booked(field, [(index, key, start_time) for index, (key, (_, _, start_time))
+                                 in enumerate(zip(keys, proposals)) if key not in missing], length)
+        for index, key in enumerate(keys):
+            if key in missing:
+                errors[index][field].append('{} {} does not exist'.format(model.__name__, key))
+        for index, show_id, start_time in booked:
+            errors[index][field].append('{} {} is booked from {:%Y-%m-%d %H:%M} (show {})'.format(
+                model.__name__, keys[index], start_time, show_id))
+        for index, other in _overlapping(keys, [proposal[2] for proposal in proposals], length):
+            errors[index][field].append('{} {} is booked from {:%Y-%m-%d %H:%M} by proposed show {}'.format(
+                model.__name__, keys[index], proposals[other][2], other))
+
+    return [dict(error) for error in errors]
+
+def _existing_ids(model, ids, lock):
+    select = db.select(model.id).where(model.id.in_(ids)).order_by(model.id)
+    if lock:
+        # in id order, so concurrent bookings lock rows in the same order
+        select = select.with_for_update()
+    return set(db.session.scalars(select))
+
+@lru_cache(maxsize=None)
+def _overlap_query(field, size):
+    # built once per field and chunk size (bound per call), since building a
+    # union of hundreds of selects costs more than running it
+    proposed = db.union_all(*(
+        db.select(db.bindparam('idx_{}'.format(i), type_=db.Integer).label('idx'),
+                  db.bindparam('key_{}'.format(i), type_=db.Integer).label('key'),
+                  db.bindparam('after_{}'.format(i), type_=db.DateTime).label('after'),
+                  db.bindparam('before_{}'.format(i), type_=db.DateTime).label('before'))
+        for i in range(size))).cte('proposed')
+    column = getattr(Show, field)
+
+    return db.select(proposed.c.idx, Show.id, Show.start_time).\
+              join(Show, db.and_(column == proposed.c.key,
+                                 Show.start_time > proposed.c.after,
+                                 Show.start_time < proposed.c.before)).\
+              order_by(proposed.c.idx, Show.start_time)
+
+def _booked(field, proposals, length):
+    # (proposal index, show id, show start_time) of every existing show that
+    # overlaps a proposal; proposals are (index, venue/artist id, start_time)
+    booked = []
+    for offset in range(0, len(proposals), CHECK_CHUNK):
+        chunk = proposals[offset:offset + CHECK_CHUNK]
+        params = {}
+        for i, (index, key, start_time) in enumerate(chunk):
+            params.update({'idx_{}'.format(i): index, 'key_{}'.format(i): key,
+                           'after_{}'.format(i): start_time - length,
+                           'before_{}'.format(i): start_time + length})
+        booked += db.session.execute(_overlap_query(field, len(chunk)), params).all()
+    return booked
+
+def _overlapping(keys, start_times, length):
+    # (index, other index) pairs of proposals for the same venue/artist whose
+    # times overlap, each reported on the later proposal
+    by_key = defaultdict(list)
+    for index, (key, start_time) in enumerate(zip(keys, start_times)):
+        by_key[key].append((start_time, index))
+    for bookings in by_key.values():
+        bookings.sort()
+        for (previous, other), (start_time, index) in zip(bookings, bookings[1:]):
+            if start_time - previous < length:
+                yield index, other
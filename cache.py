@@ -0,0 +1,191 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+
+# ----------------------------------------------------------------------------#
+# Cache backends.
+# Anything with get/set/delete/clear over string keys can back a PageCache;
+# set() takes a ttl in seconds, so a Redis-compatible store maps these onto
+# GET, SET ... EX, DEL and FLUSHDB (see RedisCache).
+# ----------------------------------------------------------------------------#
+class CacheBackend(ABC):
+    # a backend missing any of these cannot be instantiated
+    @abstractmethod
+    def get(self, key):
+        pass
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        pass
+
+    @abstractmethod
+    def delete(self, *keys):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+class LRUCache(CacheBackend):
+    # in-process default: least recently used entries are evicted past maxsize
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class RedisCache(CacheBackend):
+    # `client` is any redis-py compatible client; keys are namespaced by prefix
+    def __init__(self, client, prefix='fyyur:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(self.prefix + '*'))
+
+# ----------------------------------------------------------------------------#
+# Read-through page cache.
+# Rendered venue/artist detail pages keyed by entity id, stored with the
+# version of the page state they were rendered from (see
+# queries.detail_page_state). Entries are dropped by invalidate(), which
+# model.py calls after every committed write that changes those pages, are
+# passed over once the state moves on (a write in another process), and
+# expire on their own no later than the start of the next upcoming show,
+# when that show moves to the "past" section.
+# ----------------------------------------------------------------------------#
+class PageCache:
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind, id):
+        return '{}:{}'.format(kind, id)
+
+    def get_or_render(self, key, render, version=''):
+        # render() returns (html, expires_at); expires_at may be None. An
+        # entry is kept as "version\nhtml" and only served for the same
+        # version, so a page changed by another process renders afresh
+        entry = self.backend.get(key)
+        if entry is not None:
+            entry_version, _, html = entry.partition('\n')
+            if entry_version == version:
+                self.hits += 1
+                return html
+
+        self.misses += 1
+        html, expires_at = render()
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, (expires_at - datetime.now()).total_seconds())
+        if ttl > 0:
+            self.backend.set(key, version + '\n' + html, ttl)
+
+        return html
+
+    def invalidate(self, venue_ids=(), artist_ids=()):
+        self.backend.delete(*[self.key('venue', id) for id in venue_ids],
+                            *[self.key('artist', id) for id in artist_ids])
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.backend)}
+
+# ----------------------------------------------------------------------------#
+# Fragment cache.
+# Rendered list tiles (a show, a venue, an artist) keyed by (macro, id,
+# version), version being the latest updated_at of the rows the tile shows.
+# An edit changes the version and so the key, so entries are never
+# invalidated; stale ones age out of the backend. A listing page then joins
+# cached strings and only renders the tiles it has not seen yet.
+# ----------------------------------------------------------------------------#
+class FragmentCache:
+    def __init__(self, backend, ttl=86400):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(name, id, version):
+        return '{}:{}:{}'.format(name, id, version)
+
+    def render_many(self, name, items, render):
+        # concatenated HTML of render(item) for items with 'id' and 'version'
+        parts = []
+        for item in items:
+            key = self.key(name, item['id'], item['version'])
+            html = self.backend.get(key)
+            if html is None:
+                self.misses += 1
+                html = str(render(item))
+                if self.ttl > 0:
+                    self.backend.set(key, html, self.ttl)
+            else:
+                self.hits += 1
+            parts.append(html)
+
+        return ''.join(parts)
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.backend)}
@@ -0,0 +1,127 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import json
+
+import click
+from flask.cli import AppGroup
+
+from app import db
+from model import Venue, Artist, rollover_show_counters, rebuild_show_counters, rebuild_genre_masks, delete_in_batches, pending_deletes
+from importer import IMPORT_KINDS, READERS, BATCH_SIZE, detect_format, import_rows
+from export import export, EXPORT_COLUMNS, FORMATS
+
+# ----------------------------------------------------------------------------#
+# Show counter maintenance.
+#   flask counters rollover   # run every few minutes, e.g. from cron
+#   flask counters rebuild    # recount everything from the Show table
+# ----------------------------------------------------------------------------#
+counters = AppGroup('counters', help='Maintain the materialized show counters.')
+
+@counters.command('rollover')
+def rollover():
+    """Recount venues and artists whose next show has started."""
+    venues, artists = rollover_show_counters()
+    click.echo('rolled over {} venues, {} artists'.format(venues, artists))
+
+@counters.command('rebuild')
+@click.option('--batch-size', default=1000, show_default=True, help='rows per transaction')
+def rebuild(batch_size):
+    """Recount every venue and artist from scratch."""
+    rebuild_show_counters(batch_size)
+    click.echo('show counters rebuilt')
+
+# ----------------------------------------------------------------------------#
+# Genre mask maintenance, see genres.py.
+#   flask genres rebuild      # after appending genres to LEGAL_GENRE_NAME
+# ----------------------------------------------------------------------------#
+genre_masks = AppGroup('genres', help='Maintain the genre bitmasks.')
+
+@genre_masks.command('rebuild')
+@click.option('--batch-size', default=1000, show_default=True, help='rows per transaction')
+def rebuild_masks(batch_size):
+    """Recompute every venue's and artist's genre_mask from its genres."""
+    changed = rebuild_genre_masks(batch_size)
+    click.echo('genre masks rebuilt ({} changed)'.format(changed))
+
+# ----------------------------------------------------------------------------#
+# Batched deletes, see delete_in_batches() in model.py.
+#   flask purge venue 42      # also finishes an interrupted background delete
+#   flask purge pending       # finishes every interrupted background delete
+# ----------------------------------------------------------------------------#
+purge = AppGroup('purge', help='Delete a venue or artist and its shows in batches.')
+
+def _purge_command(model):
+    @purge.command(model.__name__.lower(), help='Delete a {} and its shows in batches.'.format(model.__name__.lower()))
+    @click.argument('id', type=int)
+    @click.option('--batch-size', default=1000, show_default=True, help='shows per transaction')
+    def command(id, batch_size):
+        if db.session.get(model, id) is None:
+            raise click.ClickException('no {} with id {}'.format(model.__name__.lower(), id))
+        deleted = delete_in_batches(model, id, batch_size)
+        click.echo('deleted {} {} and {} shows'.format(model.__name__.lower(), id, deleted))
+
+for _model in (Venue, Artist):
+    _purge_command(_model)
+
+@purge.command('pending', help='Finish the background deletes that did not complete.')
+@click.option('--batch-size', default=1000, show_default=True, help='shows per transaction')
+def purge_pending(batch_size):
+    # a delete still running in a web worker is just finished twice over
+    for model, id in pending_deletes():
+        deleted = delete_in_batches(model, id, batch_size)
+        click.echo('deleted {} {} and {} shows'.format(model.__name__.lower(), id, deleted))
+
+# ----------------------------------------------------------------------------#
+# Bulk import, see importer.py.
+#   flask import venues venues.csv
+#   flask import shows shows.jsonl --errors rejected.jsonl
+# ----------------------------------------------------------------------------#
+importer = AppGroup('import', help='Bulk import venues, artists or shows.')
+
+def _import_command(kind):
+    @importer.command(kind, help='Import {} from a CSV or JSON Lines file.'.format(kind))
+    @click.argument('source', type=click.File('r', encoding='utf-8'))
+    @click.option('--format', 'format_', type=click.Choice(sorted(READERS)),
+                  help='input format (default: from the file extension, csv otherwise)')
+    @click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='rows per INSERT')
+    @click.option('--workers', default=1, show_default=True, help='processes validating rows')
+    @click.option('--errors', 'errors_file', type=click.File('w'),
+                  help='write rejected rows here as JSON lines')
+    def command(source, format_, batch_size, workers, errors_file):
+        reader = READERS[format_ or detect_format(source.name)]
+        result = import_rows(kind, reader(source), batch_size, workers)
+
+        for line_num, errors in result.errors:
+            if errors_file:
+                errors_file.write(json.dumps({'line': line_num, 'errors': errors}) + '\n')
+            else:
+                message = ', '.join('{}: {}'.format(field, error) for field, messages in errors.items() for error in messages)
+                click.echo('line {}: {}'.format(line_num, message), err=True)
+        click.echo('imported {} of {} {} ({} rejected, {:.0f} rows/s)'.format(
+            result.inserted, result.rows, kind, len(result.errors), result.rows_per_second))
+
+for _kind in IMPORT_KINDS:
+    _import_command(_kind)
+
+# ----------------------------------------------------------------------------#
+# Streaming export, see export.py.
+#   flask export shows --format ndjson --city "San Francisco" --start 2026-01-01 -o shows.ndjson
+# ----------------------------------------------------------------------------#
+exporter = AppGroup('export', help='Stream venues, artists or shows to CSV or NDJSON.')
+
+def _export_command(kind):
+    @exporter.command(kind, help='Export {} as CSV or NDJSON.'.format(kind))
+    @click.option('--format', 'format_', type=click.Choice(sorted(FORMATS)), default='csv', show_default=True)
+    @click.option('--output', '-o', type=click.File('w', encoding='utf-8', lazy=True), default='-',
+                  help='file to write (default: stdout)')
+    @click.option('--city')
+    @click.option('--state')
+    @click.option('--start', type=click.DateTime(), help='shows starting at or after this time')
+    @click.option('--end', type=click.DateTime(), help='shows starting before this time')
+    def command(format_, output, city, state, start, end):
+        for chunk in export(kind, format_, city=city, state=state, start=start, end=end):
+            output.write(chunk)
+
+for _kind in EXPORT_COLUMNS:
+    _export_command(_kind)
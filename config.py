@@ -1,10 +1,24 @@
 import os
-SECRET_KEY = os.urandom(32)
+from sqlalchemy.pool import NullPool
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    return value.lower() in ('1', 'true', 'yes', 'on') if value else default
+
+# FYYUR_ENV=production: debug off, SECRET_KEY required, pool sized for gunicorn workers
+PRODUCTION = os.environ.get('FYYUR_ENV') == 'production'
+
+# Every worker must sign sessions with the same key, so production reads it from the environment
+SECRET_KEY = os.environ['SECRET_KEY'] if PRODUCTION else os.environ.get('SECRET_KEY') or os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 # Enable debug mode.
-DEBUG = True
+DEBUG = _env_bool('FLASK_DEBUG', not PRODUCTION)
 
 # Connect to the database
 
@@ -12,5 +26,90 @@ DEBUG = True
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://zhibaichen@localhost:5432/fyyurapp'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://zhibaichen@localhost:5432/fyyurapp')
+
+# Connection pool, per process. Every gunicorn worker holds up to
+# DB_POOL_SIZE + DB_MAX_OVERFLOW connections; with DB_MAX_CONNECTIONS set
+# (the share of Postgres max_connections this app may use) the pool is
+# sized as DB_MAX_CONNECTIONS // WEB_CONCURRENCY workers instead.
+WEB_CONCURRENCY = _env_int('WEB_CONCURRENCY', 1)
+DB_MAX_CONNECTIONS = _env_int('DB_MAX_CONNECTIONS', None)
+DB_POOL_SIZE = _env_int('DB_POOL_SIZE', max(1, DB_MAX_CONNECTIONS // WEB_CONCURRENCY) if DB_MAX_CONNECTIONS else 5)
+DB_MAX_OVERFLOW = _env_int('DB_MAX_OVERFLOW', 0 if DB_MAX_CONNECTIONS or PRODUCTION else 10)
+# Seconds to wait for a free pooled connection before failing the request
+DB_POOL_TIMEOUT = _env_int('DB_POOL_TIMEOUT', 10)
+# Recycle connections older than this (seconds), below any server/proxy idle timeout
+DB_POOL_RECYCLE = _env_int('DB_POOL_RECYCLE', 1800)
+# Test each connection with a cheap round trip when it is checked out of the pool
+DB_POOL_PRE_PING = _env_bool('DB_POOL_PRE_PING', True)
+# Server-side statement timeout in milliseconds (0 = none); gunicorn.conf.py
+# defaults it to 5000 for web workers, CLI jobs (imports, migrations) run untimed
+DB_STATEMENT_TIMEOUT_MS = _env_int('DB_STATEMENT_TIMEOUT_MS', 0)
+# DB_PGBOUNCER=1 when DATABASE_URL points at PgBouncer in transaction pooling
+# mode: PgBouncer does the pooling (NullPool here) and rejects the `options`
+# startup parameter, so set statement_timeout on the database role instead
+# (ALTER ROLE fyyur SET statement_timeout = '5s'). psycopg2 never uses
+# server-side prepared statements, so nothing else needs turning off.
+DB_PGBOUNCER = _env_bool('DB_PGBOUNCER', False)
+
+if not SQLALCHEMY_DATABASE_URI.startswith('postgresql'):
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+elif DB_PGBOUNCER:
+    SQLALCHEMY_ENGINE_OPTIONS = {'poolclass': NullPool,
+                                 'connect_args': {'application_name': 'fyyur'}}
+else:
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+        # application_name lets benchmarks.load count our connections in pg_stat_activity
+        'connect_args': {'application_name': 'fyyur'},
+    }
+    if DB_STATEMENT_TIMEOUT_MS:
+        SQLALCHEMY_ENGINE_OPTIONS['connect_args']['options'] = '-c statement_timeout={}'.format(DB_STATEMENT_TIMEOUT_MS)
+
+# Read replicas: comma separated DATABASE_REPLICA_URLS, one bind each with the
+# primary's engine options; read-only requests go to them round-robin, see replicas.py
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+SQLALCHEMY_BINDS = {'replica_{}'.format(i): dict(SQLALCHEMY_ENGINE_OPTIONS, url=url)
+                    for i, url in enumerate(DATABASE_REPLICA_URLS)}
+# A user's reads stay on the primary this long after their write (read-your-writes)
+REPLICA_STICKY_SECONDS = _env_int('REPLICA_STICKY_SECONDS', 5)
+# Healthy replicas are probed this often; one that fails is skipped for REPLICA_RETRY_SECONDS
+REPLICA_CHECK_SECONDS = _env_int('REPLICA_CHECK_SECONDS', 10)
+REPLICA_RETRY_SECONDS = _env_int('REPLICA_RETRY_SECONDS', 30)
+
+
+# Listing pages (/venues, /artists, /shows) are keyset-paginated; ?per_page= is clamped to MAX_PAGE_SIZE
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Venue/artist pages list at most this many upcoming and past shows; older past shows are paginated
+SHOWS_PER_SECTION = 12
+# Search results per page on /venues/search and /artists/search
+SEARCH_PAGE_SIZE = 20
+# Rendered venue/artist pages are cached in-process (LRU) for at most PAGE_CACHE_TTL seconds
+PAGE_CACHE_SIZE = 1024
+PAGE_CACHE_TTL = 300
+# Rendered list tiles are cached in-process by (id, updated_at), see cache.FragmentCache
+FRAGMENT_CACHE_SIZE = 20000
+FRAGMENT_CACHE_TTL = 86400
+# Compiled templates are kept on disk and shared by workers and restarts; None uses
+# Jinja's per-user temporary directory
+JINJA_BYTECODE_CACHE = _env_bool('JINJA_BYTECODE_CACHE', True)
+JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
+# A show books its venue and artist from start_time for this long; /shows/create and
+# /api/v1/bookings/check reject shows that overlap an existing or proposed booking
+SHOW_LENGTH_MINUTES = 180
+# Deleting a venue/artist with more shows than this returns at once and leaves the
+# shows to a background job deleting DELETE_BATCH_SIZE per transaction (0: never)
+BACKGROUND_DELETE_SHOWS = _env_int('BACKGROUND_DELETE_SHOWS', 10000)
+DELETE_BATCH_SIZE = 1000
 
+# Per-request statement count, DB/render time as log lines and Server-Timing headers;
+# set SLOW_QUERY_THRESHOLD_MS (e.g. 50) to also log slower statements with their SQL
+INSTRUMENTATION = True
+SLOW_QUERY_THRESHOLD_MS = None
+# Memoize the datetime template filter per request (listings repeat the same timestamps)
+DATETIME_FILTER_MEMO = True
@@ -0,0 +1,86 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import csv
+import io
+import json
+from datetime import datetime
+
+from app import db
+from model import Venue, Artist, Show
+
+YIELD_PER = 1000
+
+# ----------------------------------------------------------------------------#
+# Streaming export.
+# Column-only selects read through a server-side cursor (yield_per), turned
+# into CSV or NDJSON text one chunk of rows at a time, so memory stays flat
+# however many rows are exported. Used by `flask export` and /export/<kind>.
+# CSV writes genres comma separated, as `flask import` reads them.
+# ----------------------------------------------------------------------------#
+EXPORT_COLUMNS = {
+    'venues': [Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.phone,
+               Venue.genres, Venue.image_link, Venue.facebook_link, Venue.website,
+               Venue.seeking_talent, Venue.seeking_description],
+    'artists': [Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+                Artist.genres, Artist.image_link, Artist.facebook_link, Artist.website,
+                Artist.seeking_venue, Artist.seeking_description],
+    'shows': [Show.id, Show.start_time, Show.venue_id, Venue.name.label('venue_name'),
+              Venue.city, Venue.state, Show.artist_id, Artist.name.label('artist_name')],
+}
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def export_query(kind, city=None, state=None, start=None, end=None):
+    # city/state match the venue for shows; start/end bound show start_time
+    select = db.select(*EXPORT_COLUMNS[kind])
+    if kind == 'shows':
+        select = select.join(Venue, Venue.id == Show.venue_id).\
+                        join(Artist, Artist.id == Show.artist_id)
+        area, order_by = Venue, Show.id
+        if start is not None:
+            select = select.where(Show.start_time >= start)
+        if end is not None:
+            select = select.where(Show.start_time < end)
+    else:
+        area = Venue if kind == 'venues' else Artist
+        order_by = area.id
+    if city:
+        select = select.where(area.city == city)
+    if state:
+        select = select.where(area.state == state)
+
+    return select.order_by(order_by)
+
+def export_rows(kind, **filters):
+    result = db.session.execute(export_query(kind, **filters).execution_options(yield_per=YIELD_PER))
+    for rows in result.partitions():
+        yield rows
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def export_csv(kind, **filters):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.key for column in EXPORT_COLUMNS[kind]])
+    for rows in export_rows(kind, **filters):
+        writer.writerows([','.join(value) if isinstance(value, list) else _value(value) for value in row]
+                         for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # header of an empty export
+        yield buffer.getvalue()
+
+def export_ndjson(kind, **filters):
+    keys = [column.key for column in EXPORT_COLUMNS[kind]]
+    for rows in export_rows(kind, **filters):
+        yield ''.join(json.dumps(dict(zip(keys, map(_value, row)))) + '\n' for row in rows)
+
+WRITERS = {'csv': export_csv, 'ndjson': export_ndjson}
+
+def export(kind, format, **filters):
+    # generator of text chunks
+    return WRITERS[format](kind, **filters)
@@ -0,0 +1,102 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+from collections import namedtuple
+
+from app import db
+from model import Venue, Artist, visible
+from forms import LEGAL_GENRE_NAME, LEGAL_STATE_NAME
+from cache import LRUCache
+
+GENRES = {value for value, _ in LEGAL_GENRE_NAME}
+STATES = {value for value, _ in LEGAL_STATE_NAME}
+# most frequent cities listed in the city facet
+CITY_FACET_SIZE = 20
+
+# ----------------------------------------------------------------------------#
+# Faceted browsing.
+# /venues and /artists take ?genre= (repeatable, all must match), ?state=,
+# ?city= and ?seeking=1|0 (seeking_talent / seeking_venue). Genres are
+# matched by array containment (genres @> ARRAY[...]) against the GIN
+# indexes of migration d3a8f61c2e47. The facet counts (rows per genre,
+# state, city and seeking flag among the rows matching the current filters)
+# come from one UNION ALL over the matching rows, and are memoized against
+# the listing's page state, which changes whenever any venue/artist does.
+# ----------------------------------------------------------------------------#
+Filters = namedtuple('Filters', 'genres state city seeking')
+
+SEEKING = {Venue: Venue.seeking_talent, Artist: Artist.seeking_venue}
+
+def _seeking(model):
+    # an unset flag counts, and filters, as not seeking
+    return db.func.coalesce(SEEKING[model], False)
+
+def parse_filters(args):
+    # genres and states outside the forms' vocabularies are ignored
+    genres = tuple(sorted({genre for genre in args.getlist('genre') if genre in GENRES}))
+    state = args.get('state') if args.get('state') in STATES else None
+    seeking = {'1': True, '0': False}.get(args.get('seeking'))
+
+    return Filters(genres, state, args.get('city') or None, seeking)
+
+def filter_criteria(model, filters):
+    # venues/artists being deleted are left out of listings and facets alike
+    criteria = [visible(model)]
+    if filters.genres:
+        # genres @> CAST(ARRAY[...] AS VARCHAR[]), the operator the GIN index serves
+        criteria.append(model.genres.op('@>')(db.cast(list(filters.genres), model.genres.type)))
+    if filters.state:
+        criteria.append(model.state == filters.state)
+    if filters.city:
+        criteria.append(model.city == filters.city)
+    if filters.seeking is not None:
+        criteria.append(_seeking(model) == filters.seeking)
+    return criteria
+
+""" Format:
+    "total": 42,
+    "genre": [("Jazz", 30), ("Blues", 12), ...],     most frequent first
+    "state": [("CA", 42)],
+    "city": [("San Francisco", 40), ("Oakland", 2)],  at most CITY_FACET_SIZE
+    "seeking": {True: 10, False: 32}
+"""
+_facet_cache = LRUCache(1024)
+FACET_CACHE_TTL = 300
+
+def facet_counts(model, filters, page_state=None):
+    # page_state: listing_state(model), to reuse counts until the table changes
+    key = '{}:{}:{}'.format(model.__tablename__, filters, page_state)
+    if page_state is not None:
+        facets = _facet_cache.get(key)
+        if facets is not None:
+            return facets
+
+    matched = db.select(model.state, model.city, model.genres, _seeking(model).label('seeking')).\
+                 where(*filter_criteria(model, filters)).cte('matched')
+    genre = db.select(db.func.unnest(matched.c.genres).label('value')).subquery('genre')
+    count = db.func.count()
+    rows = db.session.execute(db.union_all(
+        db.select(db.literal('genre').label('facet'), genre.c.value, count).group_by(genre.c.value),
+        db.select(db.literal('state'), matched.c.state, count).group_by(matched.c.state),
+        db.select(db.literal('city'), matched.c.city, count).group_by(matched.c.city),
+        db.select(db.literal('seeking'), db.cast(matched.c.seeking, db.String), count).
+          group_by(matched.c.seeking))).all()
+
+    facets = {'total': 0, 'genre': [], 'state': [], 'city': [], 'seeking': {}}
+    for facet, value, number in rows:
+        if facet == 'seeking':
+            flag = value in ('true', '1')
+            facets['seeking'][flag] = facets['seeking'].get(flag, 0) + number
+            continue
+        if facet == 'state':
+            # every matching row is in exactly one state group
+            facets['total'] += number
+        if value is not None:
+            facets[facet].append((value, number))
+    for facet in ('genre', 'state', 'city'):
+        facets[facet].sort(key=lambda option: (-option[1], option[0]))
+    del facets['city'][CITY_FACET_SIZE:]
+
+    if page_state is not None:
+        _facet_cache.set(key, facets, FACET_CACHE_TTL)
+    return facets
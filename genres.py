@@ -0,0 +1,81 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+from functools import lru_cache
+
+from forms import LEGAL_GENRE_NAME
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# ----------------------------------------------------------------------------#
+# Genre masks.
+# Every venue/artist keeps its genres array (what the forms, templates and
+# API read) and, in genre_mask, the same genres as a bitmask over the forms'
+# vocabulary: bit i is GENRES[i]. Bit positions are stored, so new genres
+# must be appended to LEGAL_GENRE_NAME, never inserted or reordered (then
+# run `flask genres rebuild`). Genres outside the vocabulary stay in the
+# array but have no bit.
+# The functions below take a sequence of masks, a NumPy array when NumPy is
+# installed (whole-array operations over tens of thousands of masks in well
+# under a millisecond) and a list otherwise, and a genre list or mask.
+# ----------------------------------------------------------------------------#
+GENRES = tuple(value for value, _ in LEGAL_GENRE_NAME)
+GENRE_BITS = {genre: 1 << i for i, genre in enumerate(GENRES)}
+# all masks fit an Integer column and a uint32 array
+assert len(GENRES) <= 31
+
+def encode_genres(genres):
+    mask = 0
+    for genre in genres or ():
+        mask |= GENRE_BITS.get(genre, 0)
+    return mask
+
+@lru_cache(maxsize=4096)
+def decode_genres(mask):
+    # -> genres in vocabulary order (the order the forms submit them in);
+    # cached and shared, so don't modify the result
+    return tuple(genre for genre, bit in GENRE_BITS.items() if mask & bit)
+
+def _mask(genres):
+    return genres if isinstance(genres, int) else encode_genres(genres)
+
+def mask_array(masks):
+    return numpy.fromiter(masks, dtype=numpy.uint32) if numpy is not None else list(masks)
+
+if numpy is not None:
+    # set bits per byte, for NumPy releases without bitwise_count
+    _BYTE_BITS = numpy.array([bin(i).count('1') for i in range(256)], dtype=numpy.uint8)
+
+def popcount(masks):
+    # number of genres in each mask
+    if numpy is None:
+        return [bin(mask).count('1') for mask in masks]
+    if hasattr(numpy, 'bitwise_count'):
+        return numpy.bitwise_count(masks)
+    counts = numpy.zeros(len(masks), dtype=numpy.uint8)
+    for shift in range(0, len(GENRES), 8):
+        counts += _BYTE_BITS[(masks >> shift) & 0xff]
+    return counts
+
+def contains_all(masks, genres):
+    # -> for each mask, whether it has every one of genres
+    wanted = _mask(genres)
+    if numpy is None:
+        return [mask & wanted == wanted for mask in masks]
+    return masks & wanted == wanted
+
+def contains_any(masks, genres):
+    wanted = _mask(genres)
+    if numpy is None:
+        return [mask & wanted != 0 for mask in masks]
+    return masks & wanted != 0
+
+def overlap(masks, genres):
+    # -> for each mask, how many of genres it shares
+    wanted = _mask(genres)
+    if numpy is None:
+        return [bin(mask & wanted).count('1') for mask in masks]
+    return popcount(masks & wanted)
@@ -0,0 +1,41 @@
+# ----------------------------------------------------------------------------#
+# gunicorn settings for production:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# WEB_CONCURRENCY worker processes, each with its own SQLAlchemy pool (see
+# config.py). Set DB_MAX_CONNECTIONS to the number of Postgres connections
+# the whole app may hold and every worker gets DB_MAX_CONNECTIONS //
+# WEB_CONCURRENCY of them, so adding workers never exceeds max_connections.
+#
+# GUNICORN_WORKER_CLASS=gevent serves up to GUNICORN_WORKER_CONNECTIONS
+# requests per worker concurrently; they share the worker's pool and wait
+# up to DB_POOL_TIMEOUT for a connection, so concurrency beyond the pool
+# queues in the app instead of opening connections. gevent workers need
+# `pip install gevent psycogreen` so psycopg2 yields while waiting on
+# Postgres.
+# ----------------------------------------------------------------------------#
+import multiprocessing
+import os
+
+os.environ.setdefault('FYYUR_ENV', 'production')
+os.environ.setdefault('WEB_CONCURRENCY', str(multiprocessing.cpu_count() * 2 + 1))
+# web requests should never run for minutes; CLI jobs keep the config.py default
+os.environ.setdefault('DB_STATEMENT_TIMEOUT_MS', '5000')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:' + os.environ.get('PORT', '8000'))
+workers = int(os.environ['WEB_CONCURRENCY'])
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '100'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+keepalive = 5
+# recycle workers now and then so no single process holds on to leaked memory
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = max_requests // 10
+# each worker imports the app, and opens its pool, after the fork
+preload_app = False
+accesslog = '-'
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
@@ -0,0 +1,290 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import csv
+import json
+import time
+from datetime import datetime
+from functools import partial
+from itertools import chain, islice
+from multiprocessing import Pool
+
+from wtforms import SelectField, SelectMultipleField, DateTimeField, BooleanField
+from wtforms.fields.core import UnboundField
+from wtforms.validators import StopValidation, ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from model import Venue, Artist, Show, count_new_shows, pages_changed
+from forms import VenueForm, ArtistForm, ShowForm
+
+BATCH_SIZE = 5000
+CHUNK_SIZE = 1000
+
+# ----------------------------------------------------------------------------#
+# Bulk import.
+# Streams CSV or JSON Lines rows through the validation rules of the create
+# forms, resolves venue/artist ids once per batch and inserts each batch with
+# one multi-row INSERT. Invalid rows are reported with their line number and
+# skipped; the rest of the batch is still imported. Validation is the bulk
+# of the per-row cost, so with workers > 1 it runs in a process pool while
+# the parent inserts.
+#   flask import venues partners.csv
+#   flask import shows shows.jsonl --errors rejected.jsonl
+# ----------------------------------------------------------------------------#
+class ImportKind:
+    def __init__(self, model, form_class, columns=None, foreign_keys=None):
+        self.model = model
+        self.validator = RowValidator(form_class)
+        # form field -> model column, where the names differ
+        self.columns = columns or {}
+        # model column -> referenced model
+        self.foreign_keys = foreign_keys or {}
+        self.lengths = {column.name: column.type.length for column in model.__table__.columns
+                        if getattr(column.type, 'length', None)}
+
+    def check(self, row):
+        # -> ({column: value}, {field: [messages]}) for one input row
+        if not isinstance(row, dict):
+            return None, {'row': ['Not a valid JSON object.']}
+        data, errors = self.validator.validate(row)
+        values = {self.columns.get(name, name): value for name, value in data.items()}
+        for column in self.foreign_keys:
+            try:
+                values[column] = int(values[column])
+            except (TypeError, ValueError):
+                errors[column] = ['Not a valid integer value.']
+        for column, length in self.lengths.items():
+            if isinstance(values.get(column), str) and len(values[column]) > length:
+                errors.setdefault(column, []).append('Field cannot be longer than {} characters.'.format(length))
+
+        return values, errors
+
+class ImportResult:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.inserted = 0
+        # [(line number, {field: [messages]})]
+        self.errors = []
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.perf_counter() - self.started
+        return self.rows / elapsed if elapsed else 0.0
+
+# ----------------------------------------------------------------------------#
+# Readers.
+# Both yield (line number, {field: value}); a CSV cell may hold several
+# comma separated genres.
+# ----------------------------------------------------------------------------#
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+def read_jsonl(stream):
+    for line_num, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_num, row
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+def detect_format(filename):
+    return 'jsonl' if filename.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+# ----------------------------------------------------------------------------#
+# Validation.
+# RowValidator runs the validators declared on a form class against plain
+# dict rows. Building and processing a WTForms form costs ~100us a row; this
+# applies the same field coercion, choices and validator objects without the
+# form machinery.
+# ----------------------------------------------------------------------------#
+class _Field:
+    # the part of a wtforms Field that validators touch
+    def __init__(self, data, raw_data):
+        self.data = data
+        self.raw_data = raw_data
+        self.errors = []
+
+    def gettext(self, string):
+        return string
+
+    def ngettext(self, singular, plural, n):
+        return singular if n == 1 else plural
+
+class RowValidator:
+    def __init__(self, form_class):
+        fields = [(name, value) for name, value in vars(form_class).items() if isinstance(value, UnboundField)]
+        fields.sort(key=lambda item: item[1].creation_counter)
+        self.fields = [(name,
+                        False if issubclass(unbound.field_class, BooleanField) else None,
+                        unbound.kwargs.get('validators', ()),
+                        self._coercion(unbound))
+                       for name, unbound in fields]
+
+    @staticmethod
+    def _coercion(unbound):
+        field_class, kwargs = unbound.field_class, unbound.kwargs
+        if issubclass(field_class, SelectMultipleField):
+            choices = {value for value, _ in kwargs.get('choices', ())}
+            def coerce(value):
+                values = value.split(',') if isinstance(value, str) else value if isinstance(value, list) else [value]
+                values = [str(v).strip() for v in values if str(v).strip()]
+                invalid = [v for v in values if v not in choices]
+                if invalid:
+                    raise ValueError("'{}' is not a valid choice for this field.".format(invalid[0]))
+                return values
+        elif issubclass(field_class, SelectField):
+            choices = {value for value, _ in kwargs.get('choices', ())}
+            def coerce(value):
+                if not isinstance(value, str) or value not in choices:
+                    raise ValueError('Not a valid choice.')
+                return value
+        elif issubclass(field_class, DateTimeField):
+            formats = kwargs.get('format', ['%Y-%m-%d %H:%M:%S'])
+            formats = [formats] if isinstance(formats, str) else formats
+            def coerce(value):
+                if isinstance(value, datetime):
+                    return value
+                for format in formats if isinstance(value, str) else ():
+                    try:
+                        return datetime.strptime(value, format)
+                    except ValueError:
+                        pass
+                raise ValueError('Not a valid datetime value.')
+        elif issubclass(field_class, BooleanField):
+            false_values = set(kwargs.get('false_values') or BooleanField.false_values) | {'False', '0', 'no', 'n'}
+            def coerce(value):
+                return value not in false_values
+        else:
+            coerce = str
+
+        return coerce
+
+    def validate(self, row):
+        # -> ({field: data}, {field: [messages]})
+        data, errors = {}, {}
+        for name, empty, validators, coerce in self.fields:
+            raw = row.get(name)
+            if raw is None or raw == '' or raw == []:
+                value = empty
+            else:
+                try:
+                    value = coerce(raw)
+                except ValueError as ex:
+                    errors[name] = [str(ex)]
+                    continue
+            data[name] = value
+            if not validators:
+                continue
+            field = _Field(value, [raw] if raw is not None else [])
+            for validator in validators:
+                try:
+                    validator(None, field)
+                except StopValidation as ex:
+                    if ex.args and ex.args[0]:
+                        field.errors.append(ex.args[0])
+                    break
+                except ValidationError as ex:
+                    field.errors.append(ex.args[0])
+            if field.errors:
+                errors[name] = field.errors
+
+        return data, errors
+
+# ----------------------------------------------------------------------------#
+# Import.
+# ----------------------------------------------------------------------------#
+IMPORT_KINDS = {
+    'venues': ImportKind(Venue, VenueForm, columns={'website_link': 'website'}),
+    'artists': ImportKind(Artist, ArtistForm, columns={'website_link': 'website'}),
+    'shows': ImportKind(Show, ShowForm, foreign_keys={'venue_id': Venue, 'artist_id': Artist}),
+}
+
+def import_rows(kind, rows, batch_size=BATCH_SIZE, workers=1):
+    # rows: iterable of (line number, row) from one of the READERS
+    result = ImportResult()
+    if workers > 1:
+        with Pool(workers) as pool:
+            checked = chain.from_iterable(pool.imap(partial(_check_chunk, kind), _chunks(rows, CHUNK_SIZE)))
+            _import_checked(IMPORT_KINDS[kind], checked, batch_size, result)
+    else:
+        check = IMPORT_KINDS[kind].check
+        checked = ((line_num,) + check(row) for line_num, row in rows)
+        _import_checked(IMPORT_KINDS[kind], checked, batch_size, result)
+
+    return result
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _check_chunk(kind, rows):
+    check = IMPORT_KINDS[kind].check
+    return [(line_num,) + check(row) for line_num, row in rows]
+
+def _import_checked(kind, checked, batch_size, result):
+    batch = []
+    for line_num, values, errors in checked:
+        result.rows += 1
+        if errors:
+            result.errors.append((line_num, errors))
+            continue
+        batch.append((line_num, values))
+        if len(batch) == batch_size:
+            _insert_batch(kind, batch, result)
+            batch = []
+    if batch:
+        _insert_batch(kind, batch, result)
+
+def _insert_batch(kind, batch, result):
+    # resolve every referenced id with one query per foreign key
+    for column, target in kind.foreign_keys.items():
+        wanted = {values[column] for _, values in batch}
+        found = {id for id, in db.session.query(target.id).filter(target.id.in_(wanted))}
+        missing = [(line_num, values) for line_num, values in batch if values[column] not in found]
+        for line_num, values in missing:
+            result.errors.append((line_num, {column: ['No {} with id {}.'.format(target.__name__.lower(), values[column])]}))
+        if missing:
+            batch = [(line_num, values) for line_num, values in batch if values[column] in found]
+    if not batch:
+        return
+
+    inserted = [values for _, values in batch]
+    try:
+        db.session.execute(db.insert(kind.model.__table__), inserted)
+        changed = _count_shows(kind, inserted)
+        db.session.commit()
+    except SQLAlchemyError:
+        # something only the database caught; isolate the bad rows
+        db.session.rollback()
+        inserted = []
+        for line_num, values in batch:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(kind.model.__table__), [values])
+                inserted.append(values)
+            except SQLAlchemyError as ex:
+                result.errors.append((line_num, {'row': [str(getattr(ex, 'orig', ex)).strip()]}))
+        changed = _count_shows(kind, inserted)
+        db.session.commit()
+    result.inserted += len(inserted)
+    pages_changed(*changed)
+
+def _count_shows(kind, rows):
+    # keep the show counters in step, as Show.add() does
+    if kind.model is not Show or not rows:
+        return (), ()
+    count_new_shows([(values['venue_id'], values['artist_id'], values['start_time']) for values in rows])
+
+    return {values['venue_id'] for values in rows}, {values['artist_id'] for values in rows}
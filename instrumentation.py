@@ -0,0 +1,108 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import json
+import time
+
+import jinja2
+from flask import g, request, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ----------------------------------------------------------------------------#
+# Per-request instrumentation.
+# Counts SQL statements, DB time and rows returned through SQLAlchemy engine
+# events, times template rendering, and reports both per request as a
+# structured log line and a Server-Timing header:
+#   Server-Timing: db;dur=4.1;desc="3 statements, 12 rows", render;dur=1.8, total;dur=7.9
+# With SLOW_QUERY_THRESHOLD_MS set, statements slower than that are logged
+# with their SQL, slowest first.
+# ----------------------------------------------------------------------------#
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.render_time = 0.0
+        self.slow_statements = []
+
+    def as_dict(self):
+        return {'statements': self.statements,
+                'db_ms': round(self.db_time * 1000, 2),
+                'rows': self.rows,
+                'render_ms': round(self.render_time * 1000, 2),
+                'total_ms': round((time.perf_counter() - self.started) * 1000, 2)}
+
+def current_stats():
+    # stats of the request being served, or None outside a request
+    return g.get('request_stats') if has_app_context() else None
+
+class TimedTemplate(jinja2.Template):
+    # Flask renders the top-level template through render(); included
+    # templates render inside it and are counted as part of it
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            stats = current_stats()
+            if stats is not None:
+                stats.render_time += time.perf_counter() - started
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # the start time goes with the statement's execution context, so a
+    # statement that fails (and never reaches _after_cursor_execute) leaves
+    # nothing behind on the pooled connection
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'query_started', None)
+    stats = current_stats()
+    if started is None or stats is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats.statements += 1
+    stats.db_time += elapsed
+    if cursor.rowcount is not None and cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+    threshold = current_app.config['SLOW_QUERY_THRESHOLD_MS']
+    if threshold is not None and elapsed * 1000 >= threshold:
+        stats.slow_statements.append((elapsed, statement))
+
+def init_app(app):
+    app.config.setdefault('INSTRUMENTATION', True)
+    app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', None)
+    if not app.config['INSTRUMENTATION']:
+        return
+
+    app.jinja_env.template_class = TimedTemplate
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def report_request_stats(response):
+        stats = current_stats()
+        if stats is None:
+            return response
+        data = stats.as_dict()
+        response.headers['Server-Timing'] = (
+            'db;dur={db_ms};desc="{statements} statements, {rows} rows", '
+            'render;dur={render_ms}, total;dur={total_ms}'.format(**data))
+
+        app.logger.info(json.dumps(dict(data,
+                                        endpoint=request.endpoint,
+                                        method=request.method,
+                                        path=request.path,
+                                        status=response.status_code)))
+        for elapsed, statement in sorted(stats.slow_statements, reverse=True)[:5]:
+            app.logger.warning(json.dumps({'slow_statement_ms': round(elapsed * 1000, 2),
+                                           'endpoint': request.endpoint,
+                                           'sql': statement}))
+
+        return response
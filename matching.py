@@ -0,0 +1,235 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import heapq
+import math
+import threading
+import time
+from datetime import timedelta
+
+from app import db
+from model import Artist, Show
+from replicas import primary
+from genres import numpy, overlap
+
+# score weights: a full genre match counts most, then the same city, the
+# same state, shows the artist already played at the venue (saturating at
+# HISTORY_SHOWS) and past shows anywhere (relative to the busiest artist)
+GENRE_WEIGHT = 4.0
+CITY_WEIGHT = 2.0
+STATE_WEIGHT = 1.0
+HISTORY_WEIGHT = 1.5
+HISTORY_SHOWS = 3
+EXPERIENCE_WEIGHT = 0.5
+# how often a process reads artists that other processes changed; rows
+# updated up to REFRESH_OVERLAP before the newest one seen are read again,
+# for transactions that commit after a later one
+REFRESH_SECONDS = 5
+REFRESH_OVERLAP = timedelta(seconds=60)
+# reload once this share of the rows is masked out
+COMPACT_FRACTION = 0.25
+MAX_MATCHES = 100
+
+# ----------------------------------------------------------------------------#
+# Matchmaking.
+# ArtistMatrix holds one row per artist seeking a venue: genre mask, city,
+# state (interned to integer codes) and past show count, as NumPy columns
+# when NumPy is installed and lists otherwise. It is loaded on first use and
+# then patched rather than rebuilt: the artists passed to invalidate() (a
+# page_change_hooks hook, so every committed edit, import or show change
+# in this process) and every REFRESH_SECONDS the artists whose updated_at
+# moved. Artists that stop seeking or are deleted are masked out, and the
+# matrix reloads once COMPACT_FRACTION of it is. Scoring a venue is a few
+# whole-column operations plus one indexed query for the venue's own show
+# history.
+# ----------------------------------------------------------------------------#
+COLUMNS = (('ids', 'int64'), ('masks', 'uint32'), ('cities', 'int32'), ('states', 'int32'),
+           ('experience', 'int32'), ('active', 'bool'))
+
+def _array(values, dtype):
+    return numpy.array(values, dtype=dtype) if numpy is not None else list(values)
+
+class ArtistMatrix:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.loaded = False
+        self._dirty = set()
+        self._position = {}
+        # city/state -> code; None is never coded, so it matches nothing
+        self._codes = {}
+        self._since = None
+        self._checked_at = 0
+        for name, dtype in COLUMNS:
+            setattr(self, name, _array([], dtype))
+
+    def invalidate(self, venue_ids, artist_ids):
+        with self._lock:
+            self._dirty |= artist_ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _code(self, value):
+        return -1 if value is None else self._codes.setdefault(value, len(self._codes))
+
+    @staticmethod
+    def _select(*criteria):
+        return db.select(Artist.id, Artist.genre_mask, Artist.city, Artist.state, Artist.past_shows_count,
+                         Artist.seeking_venue, Artist.updated_at).where(*criteria)
+
+    def _append(self, rows):
+        if not rows:
+            return
+        start = len(self.ids)
+        values = {'ids': [row.id for row in rows],
+                  'masks': [row.genre_mask for row in rows],
+                  'cities': [self._code(row.city) for row in rows],
+                  'states': [self._code(row.state) for row in rows],
+                  'experience': [row.past_shows_count for row in rows],
+                  'active': [True] * len(rows)}
+        for name, dtype in COLUMNS:
+            column, added = getattr(self, name), _array(values[name], dtype)
+            setattr(self, name, numpy.concatenate((column, added)) if numpy is not None else column + added)
+        self._position.update((row.id, start + i) for i, row in enumerate(rows))
+
+    def _apply(self, rows, dirty):
+        added = []
+        for row in rows:
+            self._since = max(self._since or row.updated_at, row.updated_at)
+            position = self._position.get(row.id)
+            if position is None:
+                if row.seeking_venue:
+                    added.append(row)
+                continue
+            self.masks[position] = row.genre_mask
+            self.cities[position] = self._code(row.city)
+            self.states[position] = self._code(row.state)
+            self.experience[position] = row.past_shows_count
+            self.active[position] = bool(row.seeking_venue)
+        # dirty artists that are gone were deleted
+        for artist_id in dirty - {row.id for row in rows}:
+            self._deactivate(artist_id)
+        self._append(added)
+
+    def _deactivate(self, artist_id):
+        # with the lock held, so a reload can't move the artist meanwhile
+        position = self._position.get(artist_id)
+        if position is not None:
+            self.active[position] = False
+
+    def deactivate(self, artist_id):
+        with self._lock:
+            self._deactivate(artist_id)
+
+    def refresh(self):
+        # called with the lock held; reads the primary, like the cache fills
+        now = time.monotonic()
+        with primary():
+            if not self.loaded:
+                self._load(now)
+                return
+
+            dirty, self._dirty = self._dirty, set()
+            criteria = [Artist.id.in_(dirty)] if dirty else []
+            if now >= self._checked_at + REFRESH_SECONDS:
+                self._checked_at = now
+                if self._since is not None:
+                    criteria.append(Artist.updated_at >= self._since - REFRESH_OVERLAP)
+            if criteria:
+                self._apply(db.session.execute(self._select(db.or_(*criteria))).all(), dirty)
+                active = int(self.active.sum()) if numpy is not None else sum(self.active)
+                if len(self) - active > COMPACT_FRACTION * len(self):
+                    self.clear()
+                    self._load(now)
+
+    def _load(self, now):
+        self._since = db.session.scalar(db.select(db.func.max(Artist.updated_at)))
+        self._append(db.session.execute(self._select(Artist.seeking_venue.is_(True))).all())
+        self.loaded, self._checked_at = True, now
+
+    def _scores(self, venue, history):
+        wanted = venue.genre_mask or 0
+        genres = max(1, bin(wanted).count('1'))
+        city, state = self._codes.get(venue.city, -2), self._codes.get(venue.state, -2)
+        busiest = 0
+        if len(self):
+            busiest = math.log1p(self.experience.max() if numpy is not None else max(self.experience))
+        if numpy is not None:
+            scores = GENRE_WEIGHT / genres * overlap(self.masks, wanted)
+            scores += CITY_WEIGHT * ((self.cities == city) & (self.states == state))
+            scores += STATE_WEIGHT * (self.states == state)
+            if busiest:
+                scores += EXPERIENCE_WEIGHT / busiest * numpy.log1p(self.experience)
+        else:
+            scores = [GENRE_WEIGHT / genres * shared +
+                      CITY_WEIGHT * (artist_city == city and artist_state == state) +
+                      STATE_WEIGHT * (artist_state == state) +
+                      (EXPERIENCE_WEIGHT / busiest * math.log1p(shows) if busiest else 0)
+                      for shared, artist_city, artist_state, shows
+                      in zip(overlap(self.masks, wanted), self.cities, self.states, self.experience)]
+        for artist_id, shows in history.items():
+            position = self._position.get(artist_id)
+            if position is not None:
+                scores[position] += HISTORY_WEIGHT * min(shows, HISTORY_SHOWS) / HISTORY_SHOWS
+        return scores
+
+    def _top(self, scores, k):
+        # -> [(artist id, score), ...], best first
+        if numpy is None:
+            best = heapq.nlargest(k, (position for position, active in enumerate(self.active) if active),
+                                  key=scores.__getitem__)
+            return [(self.ids[position], scores[position]) for position in best]
+        scores[~self.active] = -numpy.inf
+        best = numpy.argpartition(-scores, k)[:k] if k < len(scores) else numpy.arange(len(scores))
+        best = best[numpy.argsort(-scores[best], kind='stable')]
+        return [(int(self.ids[position]), float(scores[position]))
+                for position in best if scores[position] != -numpy.inf]
+
+    def match(self, venue, k):
+        # venue: anything with id, genre_mask, city and state
+        history = dict(db.session.execute(db.select(Show.artist_id, db.func.count()).
+                                          where(Show.venue_id == venue.id).group_by(Show.artist_id)).all())
+        with self._lock:
+            self.refresh()
+            return self._top(self._scores(venue, history), k), history
+
+artist_matrix = ArtistMatrix()
+
+""" Format:
+    match_artists(venue, 10) ->
+    [{"artist_id": 7, "name": "...", "city": "...", "state": "...", "genres": [...],
+      "image_link": "...", "score": 7.5, "shared_genres": ["Jazz"], "same_city": true,
+      "same_state": true, "shows_at_venue": 2}, ...]
+"""
+def match_artists(venue, k=10):
+    # a few spare candidates, in case other processes deleted some meanwhile
+    ranked, history = artist_matrix.match(venue, k + 10)
+    # from the primary, as the matrix is: a lagging replica would miss
+    # artists that just started seeking and get them deactivated below
+    with primary():
+        rows = {row.id: row for row in db.session.execute(
+            db.select(Artist.id, Artist.name, Artist.city, Artist.state, Artist.genres, Artist.genre_mask,
+                      Artist.image_link).
+               where(Artist.id.in_([artist_id for artist_id, _ in ranked]), Artist.seeking_venue.is_(True)))}
+
+    matches = []
+    for artist_id, score in ranked:
+        row = rows.get(artist_id)
+        if row is None:
+            artist_matrix.deactivate(artist_id)
+            continue
+        matches.append({'artist_id': row.id,
+                        'name': row.name,
+                        'city': row.city,
+                        'state': row.state,
+                        'genres': row.genres,
+                        'image_link': row.image_link,
+                        'score': round(score, 3),
+                        'shared_genres': [genre for genre in row.genres or () if genre in (venue.genres or ())],
+                        'same_city': row.city == venue.city and row.state == venue.state,
+                        'same_state': row.state is not None and row.state == venue.state,
+                        'shows_at_venue': history.get(row.id, 0)})
+    return matches[:k]
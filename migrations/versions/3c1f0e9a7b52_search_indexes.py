@@ -0,0 +1,39 @@
+"""search indexes
+
+Revision ID: 3c1f0e9a7b52
+Revises: 25418de931e7
+Create Date: 2026-10-18 10:12:41.208334
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f0e9a7b52'
+down_revision = '25418de931e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # trigram GIN indexes for search.search(); the query side builds the same
+    # expression through search.search_document()
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute("""
+        CREATE OR REPLACE FUNCTION fyyur_search_text(name text, city text, state text, genres text[])
+        RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT coalesce(name, '') || ' ' || coalesce(city, '') || ' ' ||
+                   coalesce(state, '') || ' ' || coalesce(array_to_string(genres, ' '), '')
+        $$
+    """)
+    op.execute('CREATE INDEX ix_venue_search_trgm ON "Venue" '
+               'USING gin (fyyur_search_text(name, city, state, genres) gin_trgm_ops)')
+    op.execute('CREATE INDEX ix_artist_search_trgm ON "Artist" '
+               'USING gin (fyyur_search_text(name, city, state, genres) gin_trgm_ops)')
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS ix_artist_search_trgm')
+    op.execute('DROP INDEX IF EXISTS ix_venue_search_trgm')
+    op.execute('DROP FUNCTION IF EXISTS fyyur_search_text(text, text, text, text[])')
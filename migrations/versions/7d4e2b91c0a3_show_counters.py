@@ -0,0 +1,45 @@
+"""show counters
+
+Revision ID: 7d4e2b91c0a3
+Revises: 3c1f0e9a7b52
+Create Date: 2026-10-18 11:02:17.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d4e2b91c0a3'
+down_revision = '3c1f0e9a7b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, foreign_key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('next_show_time', sa.DateTime(), nullable=True))
+            batch_op.create_index(batch_op.f('ix_{}_next_show_time'.format(table)), ['next_show_time'], unique=False)
+
+        # backfill; later drift is fixed by `flask counters rebuild`
+        op.execute("""
+            UPDATE "{table}" SET
+                upcoming_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{fk} = "{table}".id
+                                        AND "Show".start_time > now()),
+                past_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{fk} = "{table}".id
+                                    AND "Show".start_time <= now()),
+                next_show_time = (SELECT min(start_time) FROM "Show" WHERE "Show".{fk} = "{table}".id
+                                  AND "Show".start_time > now())
+        """.format(table=table, fk=foreign_key))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f('ix_{}_next_show_time'.format(table)))
+            batch_op.drop_column('next_show_time')
+            batch_op.drop_column('past_shows_count')
+            batch_op.drop_column('upcoming_shows_count')
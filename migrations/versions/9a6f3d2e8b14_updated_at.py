@@ -0,0 +1,30 @@
+"""updated_at
+
+Revision ID: 9a6f3d2e8b14
+Revises: 7d4e2b91c0a3
+Create Date: 2026-10-18 12:26:05.114872
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a6f3d2e8b14'
+down_revision = '7d4e2b91c0a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist', 'Show'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+            batch_op.create_index(batch_op.f('ix_{}_updated_at'.format(table)), ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f('ix_{}_updated_at'.format(table)))
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,30 @@
+"""pending deletes
+
+Revision ID: a4d81e6c3b27
+Revises: f2a7c9e1b053
+Create Date: 2026-10-19 09:41:17.352904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d81e6c3b27'
+down_revision = 'f2a7c9e1b053'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # set while a background delete runs (model.mark_for_delete); nullable
+    # with no default, so adding it doesn't rewrite the tables
+    for table in ('Venue', 'Artist'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('deleting_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('deleting_at')
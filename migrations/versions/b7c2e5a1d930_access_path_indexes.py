@@ -0,0 +1,39 @@
+"""access path indexes
+
+Revision ID: b7c2e5a1d930
+Revises: 9a6f3d2e8b14
+Create Date: 2026-10-18 13:40:52.671203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7c2e5a1d930'
+down_revision = '9a6f3d2e8b14'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns); see the __table_args__ in model.py for what uses them
+INDEXES = [
+    ('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time', 'id']),
+    ('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time', 'id']),
+    ('ix_Show_start_time', 'Show', ['start_time', 'id']),
+    ('ix_Venue_state_city_name', 'Venue', ['state', 'city', 'name', 'id']),
+    ('ix_Artist_name', 'Artist', ['name', 'id']),
+]
+
+
+def upgrade():
+    # CONCURRENTLY keeps the tables writable while a large Show table is
+    # indexed; it cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
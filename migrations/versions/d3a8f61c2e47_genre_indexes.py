@@ -0,0 +1,35 @@
+"""genre indexes
+
+Revision ID: d3a8f61c2e47
+Revises: b7c2e5a1d930
+Create Date: 2026-10-18 21:24:09.415820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a8f61c2e47'
+down_revision = 'b7c2e5a1d930'
+branch_labels = None
+depends_on = None
+
+# GIN indexes for the genre filters of facets.py (genres @> ARRAY[...])
+INDEXES = [
+    ('ix_Venue_genres', 'Venue'),
+    ('ix_Artist_genres', 'Artist'),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table in INDEXES:
+            op.create_index(name, table, ['genres'], unique=False,
+                            postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,42 @@
+"""genre masks
+
+Revision ID: e5b9c2d4f718
+Revises: d3a8f61c2e47
+Create Date: 2026-10-18 23:05:41.283176
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b9c2d4f718'
+down_revision = 'd3a8f61c2e47'
+branch_labels = None
+depends_on = None
+
+# genres.GENRES as of this revision: bit i is GENRES[i]
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+          'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+          'Rock n Roll', 'Soul', 'Other']
+
+
+def upgrade():
+    vocabulary = 'CAST(ARRAY[{}] AS VARCHAR[])'.format(', '.join("'{}'".format(genre) for genre in GENRES))
+    for table in ('Venue', 'Artist'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('genre_mask', sa.Integer(), server_default='0', nullable=False))
+
+        # backfill; genres outside the vocabulary get no bit (array_position is
+        # NULL, which bit_or skips). Later drift is fixed by `flask genres rebuild`
+        op.execute("""
+            UPDATE "{table}" SET genre_mask = coalesce(
+                (SELECT bit_or(1 << (array_position({vocabulary}, genre) - 1)) FROM unnest(genres) AS genre), 0)
+            WHERE genres IS NOT NULL AND cardinality(genres) > 0
+        """.format(table=table, vocabulary=vocabulary))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('genre_mask')
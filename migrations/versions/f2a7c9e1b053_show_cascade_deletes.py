@@ -0,0 +1,42 @@
+"""show cascade deletes
+
+Revision ID: f2a7c9e1b053
+Revises: e5b9c2d4f718
+Create Date: 2026-10-19 00:12:36.904518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a7c9e1b053'
+down_revision = 'e5b9c2d4f718'
+branch_labels = None
+depends_on = None
+
+# deleting a venue/artist deletes its shows in the database (see the
+# passive_deletes relationships in model.py); both are served by the
+# (venue_id, start_time) and (artist_id, start_time) indexes
+FOREIGN_KEYS = [
+    ('Show_venue_id_fkey', 'venue_id', 'Venue'),
+    ('Show_artist_id_fkey', 'artist_id', 'Artist'),
+]
+
+
+def upgrade():
+    # NOT VALID: swapping the constraints doesn't scan Show under a lock;
+    # the rows are checked afterwards while reads and writes go on
+    for name, column, table in FOREIGN_KEYS:
+        op.drop_constraint(name, 'Show', type_='foreignkey')
+        op.create_foreign_key(name, 'Show', table, [column], ['id'], ondelete='CASCADE',
+                              postgresql_not_valid=True)
+    with op.get_context().autocommit_block():
+        for name, _, _ in FOREIGN_KEYS:
+            op.execute('ALTER TABLE "Show" VALIDATE CONSTRAINT "{}"'.format(name))
+
+
+def downgrade():
+    for name, column, table in reversed(FOREIGN_KEYS):
+        op.drop_constraint(name, 'Show', type_='foreignkey')
+        op.create_foreign_key(name, 'Show', table, [column], ['id'])
@@ -1,68 +1,101 @@
 # ----------------------------------------------------------------------------#
 # Imports
 # ----------------------------------------------------------------------------#
-from app import db
+import threading
 from datetime import datetime
 
+from flask import current_app
+
+from app import db
+from genres import encode_genres
+
+# ----------------------------------------------------------------------------#
+# Write hooks.
+# Callables in page_change_hooks are called as hook(venue_ids, artist_ids)
+# after a committed write that changes what those venue/artist pages show
+# (e.g. PageCache.invalidate).
+# ----------------------------------------------------------------------------#
+page_change_hooks = []
+
+def pages_changed(venue_ids=(), artist_ids=()):
+    venue_ids, artist_ids = set(venue_ids), set(artist_ids)
+    for hook in page_change_hooks:
+        hook(venue_ids, artist_ids)
+
 # ----------------------------------------------------------------------------#
 # Models.
 # ----------------------------------------------------------------------------#
+# genre_mask follows genres: ORM writes set it whenever genres is assigned
+# (_sync_genre_mask), and Core inserts that only give genres (the importer,
+# benchmarks.seed) get it from this default
+def genre_mask_default(context):
+    return encode_genres(context.get_current_parameters().get('genres'))
+
+# a Postgres array of genre names; JSON on SQLite, which has no arrays, so
+# the tests can run without a database server
+GENRE_LIST = db.ARRAY(db.String).with_variant(db.JSON, 'sqlite')
+
 class Show(db.Model):
     __tablename__ = 'Show'
+    # detail pages: a venue's/artist's shows split and ordered by start_time;
+    # /shows: keyset on (start_time, id)
+    __table_args__ = (db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time', 'id'),
+                      db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time', 'id'),
+                      db.Index('ix_Show_start_time', 'start_time', 'id'))
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
     # id
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
+    # ON DELETE CASCADE: deleting a venue/artist deletes its shows in the database
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+    # bumped by every ORM or Core UPDATE, see the conditional GETs in app.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+                           server_default=db.func.now(), index=True)
+    venue = db.relationship('Venue', back_populates='shows')
+    artist = db.relationship('Artist', back_populates='shows')
 
     def demo_info(self):
         data = {'id': self.id,
-                'start_time': self.start_time.strftime("%m/%d/%Y, %H:%M:%S"),
+                'start_time': self.start_time,
                 'venue_id': self.venue_id,
                 'artist_id': self.artist_id
                 }
 
         return data
 
-    """
-      "venue_id": 1,
-      "venue_name": "The Musical Hop",
-      "artist_id": 4,
-      "artist_name": "Guns N Petals",
-      "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
-      "start_time": "2019-05-21T21:30:00.000Z"
-    """
-    def demo_info_with_venue_artist(self):
-        data = self.demo_info()
-        venue = Venue.query.filter(Venue.id == data['venue_id']).first()
-        artist = Artist.query.filter(Artist.id == data['artist_id']).first()
-        data['venue_id'] = venue.id
-        data['venue_name'] = venue.name
-        data['artist_id'] = artist.id
-        data['artist_name'] = artist.name
-        data['artist_image_link'] = artist.image_link
-
-        return data
     # functions
     def add(self):
         db.session.add(self)
+        db.session.flush()
+        count_new_shows([(self.venue_id, self.artist_id, self.start_time)])
         db.session.commit()
+        pages_changed([self.venue_id], [self.artist_id])
 
     def delete(self):
+        venue_id, artist_id = self.venue_id, self.artist_id
         db.session.delete(self)
+        db.session.flush()
+        refresh_show_counters([venue_id], [artist_id])
         db.session.commit()
+        pages_changed([venue_id], [artist_id])
 
     def __repr__(self):
         return '<Show {}{}>'.format(self.artist_id, self.venue_id)
 
 class Venue(db.Model):  # parent
     __tablename__ = 'Venue'
+    # /venues: keyset on (state, city, name, id), also serves state/city filters;
+    # GIN on genres for the genre facet filters
+    __table_args__ = (db.Index('ix_Venue_state_city_name', 'state', 'city', 'name', 'id'),
+                      db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'))
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(GENRE_LIST)
+    # genres as a bitmask, see genres.py and _sync_genre_mask()
+    genre_mask = db.Column(db.Integer, nullable=False, default=genre_mask_default, server_default='0')
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
@@ -70,9 +103,20 @@ class Venue(db.Model):  # parent
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    # materialized show counters, see refresh_show_counters()
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime, index=True)
+    # set while a background delete runs, which hides the row, see mark_for_delete()
+    deleting_at = db.Column(db.DateTime)
+    # bumped by every ORM or Core UPDATE, see the conditional GETs in app.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+                           server_default=db.func.now(), index=True)
     # parent-child relationship
     # shows = db.relationship('Show', backref="venue", lazy=True)
-    shows = db.relationship('Show', backref='venue', lazy='joined', cascade="all, delete")
+    # not eager: each view picks a loading strategy (see SCALAR_ONLY below);
+    # passive_deletes: shows that aren't loaded are left to ON DELETE CASCADE
+    shows = db.relationship('Show', back_populates='venue', cascade="all, delete", passive_deletes=True)
 
     # expressive format
     # 1. basic info:
@@ -94,25 +138,9 @@ class Venue(db.Model):  # parent
 
         return data
 
-    # 2. venue grouped by city + state
-    def demo_venue_by_city_state(self):
-        venues = [venue.demo_info_with_upcoming_show_number() for venue in Venue.query.filter(Venue.city == self.city, Venue.state == self.state).all()]
-        data = {'city': self.city,
-                'state': self.state,
-                'venues': venues}
+    # 2. venue grouped by city + state: see queries.venue_directory()
 
-        return data
-
-    # 3. show count:
-    # @app.route('/venues')
-    def demo_info_with_upcoming_show_number(self):
-        upcoming_show_number = Show.query.filter(Show.start_time > datetime.now(), Show.venue_id == self.id)
-        data = self.demo_info()
-        data['upcoming_show_number'] = upcoming_show_number
-
-        return data
-
-    # 4. search show nothing; not needed
+    # 3./4. search: see search.search()
 
     # 5. show_venues: @app.route('/venues/<int:venue_id>'); individual venue page
     """ Format:
@@ -126,48 +154,40 @@ class Venue(db.Model):  # parent
     "past_shows_count": 1,
     "upcoming_shows_count": 0,
     """
-    def getUpcomingAndPastShows(self):
-        upcoming_shows, past_shows = [], []
-        # don't use Show.query.filter by venue_id, instead use join
-        # shows = Show.query.filter(Show.venue_id == self.id).all()
-        # for show in shows:
-
-        # get all shows and john with show.venues
-        shows = db.session.query(Show).join(Venue).\
-                                        join(Artist).\
-                                        filter(Venue.id == self.id).all()
-        for show in shows:
-            # show_data = show.demo_info_with_venue_artist()
-            show_data = show.demo_info()
-            venue = show.venue
-            artist = show.artist
-            # show_data['venue_image_link'] = self.image_link
-            show_data['venue_image_link'] = venue.image_link
-            show_data['venue_id'] = venue.id
-            show_data['venue_name'] = venue.name
-            show_data['artist_id'] = artist.id
-            show_data['artist_name'] = artist.name
-            show_data['artist_image_link'] = artist.image_link
-            if show.start_time > datetime.now():
-                upcoming_shows.append(show_data)
-            else:
-                past_shows.append(show_data)
+    def getUpcomingAndPastShows(self, now, limit, past_after=None):
+        return _upcoming_and_past_shows(Show.venue_id == self.id, now, limit, past_after)
 
-        return upcoming_shows, past_shows
-
-    def demo_individual(self):
-        # improvement: get all shows and then split by time
+    def demo_individual(self, now, limit, past_after=None):
+        # shows are split, counted and limited in the database, see _upcoming_and_past_shows()
         data = self.demo_info()
-        data['upcoming_shows'], data['past_shows'] = self.getUpcomingAndPastShows()
-        data['upcoming_shows_count'] = len(data['upcoming_shows'])
-        data['past_shows_count'] = len(data['past_shows'])
+        data.update(self.getUpcomingAndPastShows(now, limit, past_after))
 
         return data
 
+    @db.validates('genres')
+    def _sync_genre_mask(self, key, genres):
+        self.genre_mask = encode_genres(genres)
+        return genres
+
+    # artists whose pages list a show at this venue
+    def artist_ids(self):
+        return [artist_id for artist_id, in db.session.query(Show.artist_id).
+                                                       filter(Show.venue_id == self.id).distinct()]
+
     # improve with decoration
     def add(self):
         db.session.add(self)
         db.session.commit()
+        pages_changed(venue_ids=[self.id])
+
+    def delete(self):
+        venue_id, artist_ids = self.id, self.artist_ids()
+        db.session.delete(self)
+        db.session.flush()
+        # the database deleted the venue's shows with it
+        refresh_show_counters(artist_ids=artist_ids)
+        db.session.commit()
+        pages_changed([venue_id], artist_ids)
 
     def update(self):
         db.session.query(Venue).filter(Venue.id == self.id).update(self)
@@ -178,6 +198,9 @@ class Venue(db.Model):  # parent
 
 class Artist(db.Model):  # child
     __tablename__ = 'Artist'
+    # /artists: keyset on (name, id); GIN on genres for the genre facet filters
+    __table_args__ = (db.Index('ix_Artist_name', 'name', 'id'),
+                      db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'))
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -185,15 +208,28 @@ class Artist(db.Model):  # child
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     # genres = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(GENRE_LIST)
+    # genres as a bitmask, see genres.py and _sync_genre_mask()
+    genre_mask = db.Column(db.Integer, nullable=False, default=genre_mask_default, server_default='0')
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    # materialized show counters, see refresh_show_counters()
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime, index=True)
+    # set while a background delete runs, which hides the row, see mark_for_delete()
+    deleting_at = db.Column(db.DateTime)
+    # bumped by every ORM or Core UPDATE, see the conditional GETs in app.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+                           server_default=db.func.now(), index=True)
     # parent-child relationship
     # shows = db.relationship('Show', backref="artist", lazy=True)
-    shows = db.relationship('Show', backref='artist', lazy='joined', cascade="all, delete")
+    # not eager: each view picks a loading strategy (see SCALAR_ONLY below);
+    # passive_deletes: shows that aren't loaded are left to ON DELETE CASCADE
+    shows = db.relationship('Show', back_populates='artist', cascade="all, delete", passive_deletes=True)
 
     # expressive format
     # 1. basic info:
@@ -228,49 +264,302 @@ class Artist(db.Model):  # child
     "past_shows_count": 1,
     "upcoming_shows_count": 0,    
     """
-    def getUpcomingAndPastShows(self):
-        upcoming_shows, past_shows = [], []
-        shows = db.session.query(Show).join(Venue).\
-                                        join(Artist).\
-                                        filter(Artist.id == self.id).all()
+    def getUpcomingAndPastShows(self, now, limit, past_after=None):
+        return _upcoming_and_past_shows(Show.artist_id == self.id, now, limit, past_after)
 
-        for show in shows:
-            show_data = show.demo_info()
-            venue = show.venue
-            artist = show.artist
-            show_data['venue_image_link'] = venue.image_link
-            show_data['venue_id'] = venue.id
-            show_data['venue_name'] = venue.name
-            show_data['artist_id'] = artist.id
-            show_data['artist_name'] = artist.name
-            show_data['artist_image_link'] = artist.image_link
-            if show.start_time > datetime.now():
-                upcoming_shows.append(show_data)
-            else:
-                past_shows.append(show_data)
-
-        return upcoming_shows, past_shows
-
-    def demo_individual(self):
-        # improvment: get all shows and then split by time
+    def demo_individual(self, now, limit, past_after=None):
         data = self.demo_info()
-        data['upcoming_shows'], data['past_shows'] = self.getUpcomingAndPastShows()
-
-        # calculate show counts
-        data['upcoming_shows_count'] = len(data['upcoming_shows'])
-        data['past_shows_count'] = len(data['past_shows'])
+        data.update(self.getUpcomingAndPastShows(now, limit, past_after))
 
         return data
 
+    @db.validates('genres')
+    def _sync_genre_mask(self, key, genres):
+        self.genre_mask = encode_genres(genres)
+        return genres
+
+    # venues whose pages list a show by this artist
+    def venue_ids(self):
+        return [venue_id for venue_id, in db.session.query(Show.venue_id).
+                                                     filter(Show.artist_id == self.id).distinct()]
+
     # improve with decoration
     def add(self):
         db.session.add(self)
         db.session.commit()
+        pages_changed(artist_ids=[self.id])
 
     def delete(self):
+        artist_id, venue_ids = self.id, self.venue_ids()
         db.session.delete(self)
+        db.session.flush()
+        # the database deleted the artist's shows with it
+        refresh_show_counters(venue_ids=venue_ids)
         db.session.commit()
+        pages_changed(venue_ids, [artist_id])
 
     def __repr__(self):
         return '<Artist {}>'.format(self.name)
 
+# ----------------------------------------------------------------------------#
+# Detail pages.
+# Upcoming/past split, ordering, limits and counts are all evaluated in the
+# database against the `now` the view computed once for the request, so a
+# venue or artist with years of history still costs three bounded queries.
+# ----------------------------------------------------------------------------#
+def _upcoming_and_past_shows(criterion, now, limit, past_after=None):
+    tiles = db.session.query(Show.id,
+                             Show.start_time,
+                             Show.venue_id,
+                             Venue.name.label('venue_name'),
+                             Venue.image_link.label('venue_image_link'),
+                             Show.artist_id,
+                             Artist.name.label('artist_name'),
+                             Artist.image_link.label('artist_image_link'),
+                             *SHOW_TILE_VERSION).\
+                             join(Venue, Venue.id == Show.venue_id).\
+                             join(Artist, Artist.id == Show.artist_id).\
+                             filter(criterion)
+
+    # soonest first
+    upcoming = tiles.filter(Show.start_time > now).\
+                     order_by(Show.start_time, Show.id).limit(limit).all()
+
+    # most recent first, keyset-paginated on (start_time, id)
+    past = tiles.filter(Show.start_time <= now)
+    if past_after is not None:
+        past = past.filter(db.tuple_(Show.start_time, Show.id) < tuple(past_after))
+    past = past.order_by(Show.start_time.desc(), Show.id.desc()).limit(limit + 1).all()
+    past_next = (past[limit - 1].start_time, past[limit - 1].id) if len(past) > limit else None
+
+    upcoming_count, past_count = db.session.query(
+        db.func.count(Show.id).filter(Show.start_time > now),
+        db.func.count(Show.id).filter(Show.start_time <= now)).filter(criterion).one()
+
+    return {'upcoming_shows': [_show_tile(row) for row in upcoming],
+            'past_shows': [_show_tile(row) for row in past[:limit]],
+            'upcoming_shows_count': upcoming_count,
+            'past_shows_count': past_count,
+            'past_shows_next': past_next,
+            'next_show_start': upcoming[0].start_time if upcoming else None}
+
+def _show_tile(row):
+    return {'id': row.id,
+            'start_time': row.start_time,
+            'venue_id': row.venue_id,
+            'venue_name': row.venue_name,
+            'venue_image_link': row.venue_image_link,
+            'artist_id': row.artist_id,
+            'artist_name': row.artist_name,
+            'artist_image_link': row.artist_image_link,
+            'version': show_tile_version(row)}
+
+# a show tile shows the show, its venue and its artist; the latest of their
+# updated_at is the tile's version in the fragment cache (app.tiles)
+SHOW_TILE_VERSION = (Show.updated_at,
+                     Venue.updated_at.label('venue_updated_at'),
+                     Artist.updated_at.label('artist_updated_at'))
+
+def show_tile_version(row):
+    return max(row.updated_at, row.venue_updated_at, row.artist_updated_at)
+
+# ----------------------------------------------------------------------------#
+# Show counters.
+# Venue/Artist carry upcoming_shows_count, past_shows_count and
+# next_show_time so listings can show counts without touching Show. They
+# are written in the same transaction as the show change: adding shows
+# bumps them in place, deleting one (directly or by cascade) recounts the
+# affected rows. Shows cross from upcoming to past with time alone, so rows
+# whose next_show_time has passed are recounted by rollover_show_counters(),
+# run periodically (`flask counters rollover`). `flask counters rebuild`
+# recounts everything.
+# ----------------------------------------------------------------------------#
+def count_new_shows(shows, now=None):
+    # shows: (venue_id, artist_id, start_time) of rows just inserted; one
+    # executemany UPDATE per table adds them to the counters
+    now = now or datetime.now()
+    for model, position in ((Venue, 0), (Artist, 1)):
+        changes = {}
+        for show in shows:
+            upcoming, past, next_show_time = changes.get(show[position], (0, 0, None))
+            start_time = show[2]
+            if start_time > now:
+                upcoming += 1
+                next_show_time = min(next_show_time or start_time, start_time)
+            else:
+                past += 1
+            changes[show[position]] = (upcoming, past, next_show_time)
+        if not changes:
+            continue
+
+        table = model.__table__
+        next_show_time = db.bindparam('new_next_show_time', type_=db.DateTime)
+        statement = db.update(table).where(table.c.id == db.bindparam('model_id')).values(
+            upcoming_shows_count=table.c.upcoming_shows_count + db.bindparam('new_upcoming'),
+            past_shows_count=table.c.past_shows_count + db.bindparam('new_past'),
+            next_show_time=db.case((next_show_time.is_(None), table.c.next_show_time),
+                                   (table.c.next_show_time.is_(None), next_show_time),
+                                   (table.c.next_show_time > next_show_time, next_show_time),
+                                   else_=table.c.next_show_time))
+        db.session.execute(statement, [{'model_id': id,
+                                        'new_upcoming': upcoming,
+                                        'new_past': past,
+                                        'new_next_show_time': next_show_time}
+                                       for id, (upcoming, past, next_show_time) in changes.items()])
+
+def refresh_show_counters(venue_ids=(), artist_ids=(), now=None):
+    # recount the given rows; pass None instead of ids to recount the whole table
+    now = now or datetime.now()
+    for model, foreign_key, ids in ((Venue, Show.venue_id, venue_ids), (Artist, Show.artist_id, artist_ids)):
+        if ids is not None and not ids:
+            continue
+        shows = lambda *criteria: db.select(*criteria).where(foreign_key == model.id).scalar_subquery()
+        values = {model.upcoming_shows_count: shows(db.func.count(Show.id)).where(Show.start_time > now),
+                  model.past_shows_count: shows(db.func.count(Show.id)).where(Show.start_time <= now),
+                  model.next_show_time: shows(db.func.min(Show.start_time)).where(Show.start_time > now)}
+        query = db.session.query(model)
+        if ids is not None:
+            query = query.filter(model.id.in_(ids))
+        query.update(values, synchronize_session=False)
+
+def touch(model, ids):
+    # bump updated_at of rows whose pages show an edited venue/artist, so
+    # their validators (queries.detail_page_state) move in every process
+    if ids:
+        db.session.query(model).filter(model.id.in_(ids)).\
+                                update({model.updated_at: datetime.now()}, synchronize_session=False)
+
+def rollover_show_counters(now=None):
+    now = now or datetime.now()
+    venue_ids = [id for id, in db.session.query(Venue.id).filter(Venue.next_show_time <= now)]
+    artist_ids = [id for id, in db.session.query(Artist.id).filter(Artist.next_show_time <= now)]
+    refresh_show_counters(venue_ids, artist_ids, now)
+    db.session.commit()
+    pages_changed(venue_ids, artist_ids)
+
+    return len(venue_ids), len(artist_ids)
+
+def rebuild_show_counters(batch_size=1000, now=None):
+    # recount every venue and artist, one committed batch of ids at a time
+    now = now or datetime.now()
+    for model in (Venue, Artist):
+        ids = [id for id, in db.session.query(model.id).order_by(model.id)]
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            if model is Venue:
+                refresh_show_counters(batch, (), now)
+            else:
+                refresh_show_counters((), batch, now)
+            db.session.commit()
+
+def rebuild_genre_masks(batch_size=1000):
+    # recompute genre_mask from genres, e.g. after genres were appended to the
+    # vocabulary; only rows whose mask changes are written. Returns that count.
+    changed = 0
+    for model in (Venue, Artist):
+        table = model.__table__
+        statement = db.update(table).where(table.c.id == db.bindparam('model_id')).\
+                       values(genre_mask=db.bindparam('new_mask'),
+                              # not a change anyone sees, keep the cache versions
+                              updated_at=table.c.updated_at)
+        last_id = 0
+        while True:
+            rows = db.session.execute(db.select(table.c.id, table.c.genres, table.c.genre_mask).
+                                      where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            updates = [{'model_id': row.id, 'new_mask': encode_genres(row.genres)}
+                       for row in rows if encode_genres(row.genres) != row.genre_mask]
+            if updates:
+                db.session.execute(statement, updates)
+                db.session.commit()
+                changed += len(updates)
+    return changed
+
+# ----------------------------------------------------------------------------#
+# Large deletes.
+# Venue.delete()/Artist.delete() remove every show in the same statement
+# (ON DELETE CASCADE), which for tens of thousands of shows holds row locks
+# for the whole delete. delete_in_batches() removes the shows batch_size at
+# a time, each batch its own transaction with its counters and cache
+# invalidation, then the venue/artist itself. It can be re-run after an
+# interruption, and runs in a background thread (delete_in_background,
+# used by the delete views above BACKGROUND_DELETE_SHOWS) or from the CLI
+# (`flask purge venue 42`). A background delete is first recorded in
+# deleting_at, which hides the venue/artist from the listing, search and
+# detail pages, keeps a second one from starting and, should the thread
+# not finish (a worker recycled or killed), leaves the delete for
+# `flask purge pending`.
+# ----------------------------------------------------------------------------#
+def visible(model):
+    # criterion for the venues/artists not being deleted
+    return model.deleting_at.is_(None)
+
+def mark_for_delete(model, id):
+    # -> False when a delete of this row is already under way
+    marked = db.session.execute(db.update(model).where(model.id == id, visible(model)).
+                                values(deleting_at=datetime.now())).rowcount
+    db.session.commit()
+    if marked:
+        pages_changed(*(([id], ()) if model is Venue else ((), [id])))
+    return bool(marked)
+
+def delete_in_batches(model, id, batch_size=1000):
+    foreign_key, other_key = (Show.venue_id, Show.artist_id) if model is Venue else (Show.artist_id, Show.venue_id)
+    deleted = 0
+    while True:
+        shows = db.session.execute(db.select(Show.id, other_key).where(foreign_key == id).
+                                   order_by(Show.id).limit(batch_size)).all()
+        if not shows:
+            break
+        db.session.execute(db.delete(Show).where(Show.id.in_([show_id for show_id, _ in shows])),
+                           execution_options={'synchronize_session': False})
+        others = {other_id for _, other_id in shows}
+        changed = ([id], others) if model is Venue else (others, [id])
+        refresh_show_counters(*changed)
+        db.session.commit()
+        pages_changed(*changed)
+        deleted += len(shows)
+
+    row = db.session.get(model, id)
+    if row is not None:
+        row.delete()
+    return deleted
+
+def delete_in_background(model, id, batch_size=1000):
+    # -> False, starting nothing, when a delete of this row is already under way
+    app = current_app._get_current_object()
+    if not mark_for_delete(model, id):
+        return False
+
+    def run():
+        with app.app_context():
+            try:
+                delete_in_batches(model, id, batch_size)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('deleting %s %s failed; run `flask purge %s %s` to finish',
+                                     model.__name__, id, model.__name__.lower(), id)
+
+    app.logger.info('deleting %s %s in the background; `flask purge pending` finishes it if interrupted',
+                    model.__name__, id)
+    threading.Thread(target=run, name='delete-{}-{}'.format(model.__tablename__, id), daemon=True).start()
+    return True
+
+def pending_deletes():
+    # -> [(model, id), ...] marked for deletion, oldest first
+    pending = []
+    for model in (Venue, Artist):
+        pending += [(deleting_at, model, id) for id, deleting_at in
+                    db.session.execute(db.select(model.id, model.deleting_at).where(~visible(model)))]
+    return [(model, id) for _, model, id in sorted(pending, key=lambda entry: entry[0])]
+
+# ----------------------------------------------------------------------------#
+# Loading strategies.
+# Relationships are never eager-loaded globally; every query picks one.
+# SCALAR_ONLY is used by the listing/search/edit/detail paths: only the
+# entity's own columns are loaded and touching a relationship raises instead
+# of silently issuing a query per row.
+# ----------------------------------------------------------------------------#
+SCALAR_ONLY = (db.raiseload('*'),)
@@ -0,0 +1,195 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from itertools import groupby
+from datetime import datetime
+
+from app import db
+from model import Venue, Artist, Show, SHOW_TILE_VERSION, show_tile_version, visible
+
+DEFAULT_PAGE_SIZE = 50
+
+# ----------------------------------------------------------------------------#
+# Read-side queries.
+# These build the listing pages from column-only selects so a page costs a
+# fixed number of statements no matter how many rows it shows.
+# Every listing is keyset-paginated: `after` is the sort key of the last row
+# of the previous page, so no OFFSET scan is needed for deep pages.
+# ----------------------------------------------------------------------------#
+
+# Cursor tokens: the sort key of the last row, as url-safe base64 JSON.
+def encode_cursor(key):
+    if key is None:
+        return None
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+    return urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(token, *types):
+    # raises ValueError for any token we did not hand out
+    try:
+        values = json.loads(urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError('cursor does not match this listing')
+        # None stays None: a nullable sort column (Venue.state) may end a page
+        return tuple(None if value is None else
+                     datetime.fromisoformat(value) if type_ is datetime else type_(value)
+                     for value, type_ in zip(values, types))
+    except TypeError as ex:
+        raise ValueError('malformed cursor') from ex
+
+def _page(query, order_by, key, limit):
+    # fetch one extra row to know whether there is a next page
+    rows = query.order_by(*order_by).limit(limit + 1).all()
+    next_key = key(rows[limit - 1]) if len(rows) > limit else None
+
+    return rows[:limit], next_key
+
+# @app.route('/venues')
+""" Format:
+    [{
+      "city": "San Francisco",
+      "state": "CA",
+      "venues": [{
+        "id": 1,
+        "name": "The Musical Hop",
+        "num_upcoming_shows": 0,
+      }]
+    }]
+"""
+VENUE_DIRECTORY_KEY = (str, str, str, int)
+
+def venue_directory(after=None, limit=DEFAULT_PAGE_SIZE, criteria=()):
+    # num_upcoming_shows is the materialized counter, see model.refresh_show_counters();
+    # criteria narrow the listing (facets.filter_criteria)
+    query = db.session.query(Venue.state,
+                             Venue.city,
+                             Venue.id,
+                             Venue.name,
+                             Venue.upcoming_shows_count.label('num_upcoming_shows'),
+                             Venue.updated_at).\
+                             filter(*criteria)
+    if after is not None:
+        # venues without a state come last; a row comparison against NULL
+        # is never true, so the state is compared on its own
+        state, rest = after[0], db.tuple_(Venue.city, Venue.name, Venue.id) > tuple(after[1:])
+        if state is None:
+            query = query.filter(Venue.state.is_(None), rest)
+        else:
+            query = query.filter(db.or_(Venue.state > state,
+                                        Venue.state.is_(None),
+                                        db.and_(Venue.state == state, rest)))
+
+    rows, next_key = _page(query,
+                           (Venue.state.asc().nulls_last(), Venue.city, Venue.name, Venue.id),
+                           lambda row: (row.state, row.city, row.name, row.id),
+                           limit)
+
+    areas = []
+    for (state, city), venues in groupby(rows, key=lambda row: (row.state, row.city)):
+        areas.append({'city': city,
+                      'state': state,
+                      'venues': [{'id': venue.id,
+                                  'name': venue.name,
+                                  'num_upcoming_shows': venue.num_upcoming_shows,
+                                  'version': venue.updated_at}
+                                 for venue in venues]})
+
+    return areas, next_key
+
+# @app.route('/artists')
+ARTIST_DIRECTORY_KEY = (str, int)
+
+def artist_directory(after=None, limit=DEFAULT_PAGE_SIZE, criteria=()):
+    query = db.session.query(Artist.id, Artist.name, Artist.updated_at).filter(*criteria)
+    if after is not None:
+        query = query.filter(db.tuple_(Artist.name, Artist.id) > tuple(after))
+
+    rows, next_key = _page(query,
+                           (Artist.name, Artist.id),
+                           lambda row: (row.name, row.id),
+                           limit)
+
+    return [{'id': row.id, 'name': row.name, 'version': row.updated_at} for row in rows], next_key
+
+# @app.route('/shows')
+""" Format:
+    "venue_id": 1,
+    "venue_name": "The Musical Hop",
+    "artist_id": 4,
+    "artist_name": "Guns N Petals",
+    "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
+    "start_time": "2019-05-21T21:30:00.000Z"
+"""
+SHOW_FEED_KEY = (datetime, int)
+
+def show_feed(after=None, limit=DEFAULT_PAGE_SIZE):
+    query = db.session.query(Show.id,
+                             Show.start_time,
+                             Show.venue_id,
+                             Venue.name.label('venue_name'),
+                             Show.artist_id,
+                             Artist.name.label('artist_name'),
+                             Artist.image_link.label('artist_image_link'),
+                             *SHOW_TILE_VERSION).\
+                             join(Venue, Venue.id == Show.venue_id).\
+                             join(Artist, Artist.id == Show.artist_id).\
+                             filter(visible(Venue), visible(Artist))
+    if after is not None:
+        query = query.filter(db.tuple_(Show.start_time, Show.id) > tuple(after))
+
+    rows, next_key = _page(query,
+                           (Show.start_time, Show.id),
+                           lambda row: (row.start_time, row.id),
+                           limit)
+
+    shows = [{'id': row.id,
+              'start_time': row.start_time,
+              'venue_id': row.venue_id,
+              'venue_name': row.venue_name,
+              'artist_id': row.artist_id,
+              'artist_name': row.artist_name,
+              'artist_image_link': row.artist_image_link,
+              'version': show_tile_version(row)}
+             for row in rows]
+
+    return shows, next_key
+
+# ----------------------------------------------------------------------------#
+# Page validators.
+# One aggregate per page that changes whenever the page would, for the
+# conditional GETs in app.py. Edits bump updated_at, and so do the show
+# counters, so adding or deleting a show bumps its venue and artist; deletes
+# also show in the row counts. A venue/artist page is judged from its own
+# row alone: its counters and next_show_time follow its shows, and edits to
+# the other side of its shows touch it (model.touch). -> (state, last_modified) or None
+# ----------------------------------------------------------------------------#
+def _last_modified(*times):
+    times = [time for time in times if time is not None]
+    return max(times) if times else None
+
+def listing_state(*models):
+    # every page of a listing over these tables
+    aggregates = []
+    for model in models:
+        aggregates += [db.select(db.func.count(model.id)).scalar_subquery(),
+                       db.select(db.func.max(model.updated_at)).scalar_subquery()]
+    state = tuple(db.session.execute(db.select(*aggregates)).one())
+
+    return state, _last_modified(*state[1::2])
+
+def detail_page_state(model, id, now=None):
+    # a venue/artist page, from its row; None once its next show has started
+    # and until rollover_show_counters() recounts it, as the page then moves
+    # with the clock
+    now = now or datetime.now()
+    state = db.session.query(model.updated_at,
+                             model.upcoming_shows_count,
+                             model.past_shows_count,
+                             model.next_show_time).\
+                             filter(model.id == id).first()
+    if state is None or (state.next_show_time is not None and state.next_show_time <= now):
+        return None
+
+    return tuple(state), state.updated_at
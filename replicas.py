@@ -0,0 +1,133 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+from flask import g, request, session, current_app, has_request_context
+from flask_sqlalchemy.session import Session
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# ----------------------------------------------------------------------------#
+# Read replicas.
+# Replicas are the SQLALCHEMY_BINDS named replica_* (config.py builds them
+# from DATABASE_REPLICA_URLS). A read-only request (GET/HEAD, or a view
+# marked @read_only) picks one replica round-robin and every ORM/Core read
+# of the request runs there; flushes and all other requests use the primary.
+# A replica is probed with SELECT 1 every REPLICA_CHECK_SECONDS, and one that
+# fails a probe or drops a connection is skipped for REPLICA_RETRY_SECONDS;
+# with none healthy, reads fall back to the primary. After a write request
+# the user's session reads from the primary for REPLICA_STICKY_SECONDS so
+# they see their own change despite replication lag.
+# ----------------------------------------------------------------------------#
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context():
+            replica = g.get('read_replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def read_only(view):
+    # route a view to a replica even for methods other than GET (e.g. search POSTs)
+    view.read_only = True
+    return view
+
+@contextmanager
+def primary():
+    # run the enclosed reads against the primary, e.g. to fill a cache that
+    # must not keep replica-lagged data
+    replica = g.pop('read_replica', None)
+    try:
+        yield
+    finally:
+        if replica is not None:
+            g.read_replica = replica
+
+class ReplicaRouter:
+    def __init__(self, db, app=None):
+        self.db = db
+        self.keys = []
+        self._lock = threading.Lock()
+        # key -> (healthy, next check at)
+        self._health = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+        app.config.setdefault('REPLICA_CHECK_SECONDS', 10)
+        app.config.setdefault('REPLICA_RETRY_SECONDS', 30)
+        self.config = app.config
+        self.keys = sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith('replica'))
+        self._cycle = itertools.cycle(self.keys)
+        app.extensions['replicas'] = self
+        if not self.keys:
+            return
+
+        with app.app_context():
+            for key in self.keys:
+                sa.event.listen(self.db.engines[key], 'handle_error', self._on_error(key))
+        app.before_request(self.route_request)
+        app.after_request(self.stick_after_write)
+
+    def _on_error(self, key):
+        def handle_error(context):
+            if context.is_disconnect:
+                self.mark_down(key)
+        return handle_error
+
+    def mark_down(self, key):
+        with self._lock:
+            self._health[key] = (False, time.monotonic() + self.config['REPLICA_RETRY_SECONDS'])
+
+    def _probe(self, key):
+        try:
+            with self.db.engines[key].connect() as conn:
+                conn.execute(sa.text('SELECT 1'))
+            return True
+        except sa.exc.SQLAlchemyError:
+            return False
+
+    def _healthy(self, key):
+        now = time.monotonic()
+        with self._lock:
+            healthy, next_check = self._health.get(key, (True, 0))
+        if now < next_check:
+            return healthy
+        healthy = self._probe(key)
+        interval = self.config['REPLICA_CHECK_SECONDS' if healthy else 'REPLICA_RETRY_SECONDS']
+        with self._lock:
+            self._health[key] = (healthy, now + interval)
+        return healthy
+
+    def replica(self):
+        # the next healthy replica engine, or None for the primary
+        for _ in self.keys:
+            with self._lock:
+                key = next(self._cycle)
+            if self._healthy(key):
+                return self.db.engines[key]
+        return None
+
+    def health(self):
+        return {key: self._health.get(key, (True, 0))[0] for key in self.keys}
+
+    @staticmethod
+    def _read_only_request():
+        view = current_app.view_functions.get(request.endpoint)
+        return request.method in SAFE_METHODS or getattr(view, 'read_only', False)
+
+    def route_request(self):
+        if not self._read_only_request() or session.get('primary_until', 0) > time.time():
+            return
+        g.read_replica = self.replica()
+
+    def stick_after_write(self, response):
+        if not self._read_only_request() and response.status_code < 400:
+            session['primary_until'] = time.time() + self.config['REPLICA_STICKY_SECONDS']
+        return response
@@ -0,0 +1,131 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import re
+from collections import defaultdict
+
+from app import db
+from model import Venue, Artist, visible
+
+# ----------------------------------------------------------------------------#
+# Search.
+# A venue/artist matches when the term is a case-insensitive substring of its
+# search document (name, city, state and genres); matches are ranked by
+# trigram similarity, name first. On Postgres this runs against the pg_trgm
+# GIN index from migration 3c1f0e9a7b52; any other engine (sqlite in tests)
+# uses the in-process MemorySearchIndex with the same matching and ranking.
+# ----------------------------------------------------------------------------#
+
+# @app.route('/venues/search'), @app.route('/artists/search')
+""" Format:
+    "count": 1,
+    "page": 1,
+    "has_next": False,
+    "data": [{
+      "id": 4,
+      "name": "Guns N Petals",
+      "city": "San Francisco",
+      "state": "CA",
+    }]
+"""
+def search(model, term, page=1, per_page=20):
+    term = term.strip()
+    offset = (page - 1) * per_page
+    if db.engine.dialect.name == 'postgresql':
+        count, rows = _trigram_search(model, term, offset, per_page)
+    else:
+        count, rows = _memory_index(model).search(term, offset, per_page)
+
+    return {'count': count,
+            'page': page,
+            'has_next': offset + len(rows) < count,
+            'data': [{'id': row.id, 'name': row.name, 'city': row.city, 'state': row.state}
+                     for row in rows]}
+
+# ----------------------------------------------------------------------------#
+# Postgres: pg_trgm.
+# ----------------------------------------------------------------------------#
+def search_document(model):
+    # must stay identical to the indexed expression in the migration
+    return db.func.fyyur_search_text(model.name, model.city, model.state, model.genres)
+
+def _trigram_search(model, term, offset, limit):
+    document = search_document(model)
+    rank = 2 * db.func.similarity(model.name, term) + db.func.similarity(document, term)
+
+    count = db.session.query(db.func.count(model.id)).\
+                       filter(document.icontains(term, autoescape=True), visible(model)).scalar()
+    rows = db.session.query(model.id, model.name, model.city, model.state).\
+                      filter(document.icontains(term, autoescape=True), visible(model)).\
+                      order_by(rank.desc(), model.name, model.id).\
+                      offset(offset).limit(limit).all()
+
+    return count, rows
+
+# ----------------------------------------------------------------------------#
+# Fallback: in-process trigram index.
+# Built from one column-only select on first use and rebuilt after any
+# insert/update/delete of the model (see the mapper events and hook below).
+# ----------------------------------------------------------------------------#
+def trigrams(text):
+    # pg_trgm's trigram set: lower-cased alphanumeric words padded with
+    # two spaces in front and one behind
+    grams = set()
+    for word in re.findall(r'[^\W_]+', text.lower()):
+        word = '  ' + word + ' '
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+def similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+class MemorySearchIndex:
+    def __init__(self, rows):
+        self.rows = {}
+        self.documents = {}
+        self.postings = defaultdict(set)
+        for row in rows:
+            document = ' '.join([row.name or '', row.city or '', row.state or ''] + list(row.genres or [])).lower()
+            self.rows[row.id] = row
+            self.documents[row.id] = document
+            for i in range(len(document) - 2):
+                self.postings[document[i:i + 3]].add(row.id)
+
+    def search(self, term, offset, limit):
+        term = term.lower()
+        if len(term) < 3:
+            candidates = self.documents.keys()
+        else:
+            grams = sorted((term[i:i + 3] for i in range(len(term) - 2)),
+                           key=lambda gram: len(self.postings.get(gram, ())))
+            candidates = set.intersection(*(self.postings.get(gram, set()) for gram in grams))
+        matches = [self.rows[id] for id in candidates if term in self.documents[id]]
+        matches.sort(key=lambda row: (-(2 * similarity(row.name, term) + similarity(self.documents[row.id], term)),
+                                      row.name, row.id))
+
+        return len(matches), matches[offset:offset + limit]
+
+_memory_indexes = {}
+
+def _memory_index(model):
+    if model not in _memory_indexes:
+        rows = db.session.query(model.id, model.name, model.city, model.state, model.genres).\
+                          filter(visible(model)).all()
+        _memory_indexes[model] = MemorySearchIndex(rows)
+    return _memory_indexes[model]
+
+def _invalidate(mapper, connection, target):
+    _memory_indexes.pop(mapper.class_, None)
+
+for _model in (Venue, Artist):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        db.event.listen(_model, _event, _invalidate)
+
+def search_changed(venue_ids, artist_ids):
+    # page_change_hooks hook, for the Core writes the mapper events above
+    # don't see (imports, mark_for_delete)
+    if venue_ids:
+        _memory_indexes.pop(Venue, None)
+    if artist_ids:
+        _memory_indexes.pop(Artist, None)
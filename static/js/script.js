@@ -2,3 +2,138 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// "Load more" on the listing pages (/venues, /artists, /shows): fetch the
+// next page as an HTML fragment and append it in place. The link's href is
+// the no-JS fallback; scrolling it into view loads the next page too.
+(function () {
+  var loading = false;
+
+  function loadMore(link) {
+    if (loading) return;
+    loading = true;
+    var listing = document.querySelector(link.dataset.target);
+    var pageUrl = link.dataset.pageUrl;
+    fetch(pageUrl + (pageUrl.indexOf('?') < 0 ? '?' : '&') + 'cursor=' + encodeURIComponent(link.dataset.cursor))
+      .then(function (response) { return response.json(); })
+      .then(function (page) {
+        var fragment = document.createElement('div');
+        fragment.innerHTML = page.html;
+
+        // a venue area can span two pages: merge it into the area already shown
+        var areas = listing.querySelectorAll('[data-area]');
+        var last = areas[areas.length - 1];
+        var first = fragment.querySelector('[data-area]');
+        if (first && last && first.dataset.area === last.dataset.area) {
+          var items = last.querySelector('ul.items');
+          first.querySelectorAll('ul.items > li').forEach(function (li) { items.appendChild(li); });
+          first.remove();
+        }
+
+        while (fragment.firstChild) listing.appendChild(fragment.firstChild);
+        if (page.next_cursor) {
+          link.dataset.cursor = page.next_cursor;
+          var next = new URL(link.href);
+          next.searchParams.set('cursor', page.next_cursor);
+          link.href = next.toString();
+        } else {
+          link.remove();
+        }
+      })
+      .finally(function () { loading = false; });
+  }
+
+  document.addEventListener('click', function (e) {
+    var link = e.target.closest('a.load-more');
+    if (!link) return;
+    e.preventDefault();
+    loadMore(link);
+  });
+
+  var link = document.querySelector('a.load-more');
+  if (link && 'IntersectionObserver' in window) {
+    new IntersectionObserver(function (entries) {
+      entries.forEach(function (entry) {
+        if (entry.isIntersecting && document.body.contains(link)) loadMore(link);
+      });
+    }).observe(link);
+  }
+})();
+
+// Show form: once artist, venue and start time are filled in, ask
+// /api/v1/bookings/check whether the slot is free and say so under the form.
+// The server checks again on submit.
+(function () {
+  var form = document.querySelector('form[data-booking-check]');
+  if (!form) return;
+  var status = form.querySelector('.booking-status');
+  var pending = 0;
+
+  function check() {
+    var params = new URLSearchParams();
+    var complete = ['venue_id', 'artist_id', 'start_time'].every(function (name) {
+      var value = form.elements[name].value.trim();
+      params.set(name, value);
+      return value !== '';
+    });
+    status.textContent = '';
+    status.className = 'booking-status help-block';
+    if (!complete) return;
+
+    var request = ++pending;
+    fetch(form.dataset.bookingCheck + '?' + params)
+      .then(function (response) { return response.json(); })
+      .then(function (result) {
+        if (request !== pending) return;
+        if (result.error) {
+          status.textContent = result.error;
+          return;
+        }
+        var booking = result.data[0];
+        var messages = [];
+        Object.keys(booking.errors).forEach(function (field) {
+          messages = messages.concat(booking.errors[field]);
+        });
+        status.textContent = booking.available ? 'Venue and artist are free at this time.' : messages.join(' ');
+        status.className = 'booking-status help-block ' + (booking.available ? 'text-success' : 'text-danger');
+      });
+  }
+
+  form.addEventListener('change', check);
+})();
+
+// Show form: typing in a name field suggests matching artists/venues from
+// /api/v1/<kind>/autocomplete; picking one fills in its id field.
+(function () {
+  document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var idField = document.getElementById(input.dataset.autocompleteId);
+    var ids = {};
+    var pending = 0;
+
+    input.addEventListener('input', function () {
+      var picked = ids[input.value];
+      if (picked !== undefined) {
+        idField.value = picked;
+        idField.dispatchEvent(new Event('change', { bubbles: true }));
+        return;
+      }
+      var term = input.value.trim();
+      if (!term) return;
+      var request = ++pending;
+      fetch(input.dataset.autocomplete + '?' + new URLSearchParams({ q: term }))
+        .then(function (response) { return response.json(); })
+        .then(function (result) {
+          if (request !== pending || !result.data) return;
+          ids = {};
+          list.innerHTML = '';
+          result.data.forEach(function (item) {
+            var option = document.createElement('option');
+            option.value = item.name + (item.city ? ' (' + item.city + ')' : '') + ' #' + item.id;
+            ids[option.value] = item.id;
+            list.appendChild(option);
+          });
+        });
+    });
+  });
+})();
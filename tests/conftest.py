@@ -0,0 +1,22 @@
+import os
+import sys
+
+# the app modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.py reads DATABASE_URL when app is first imported. Without
+# TEST_DATABASE_URL the tests run on an in-memory SQLite database, and the
+# Postgres-only paths (facet counts, trigram search) are skipped
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL') or 'sqlite://'
+POSTGRES = os.environ['DATABASE_URL'].startswith('postgresql')
+
+def rebuild_schema():
+    # Postgres through the migrations, which also create the search
+    # functions; SQLite straight from the models
+    from app import db
+    if POSTGRES:
+        from benchmarks.seed import reset
+        reset()
+    else:
+        db.drop_all()
+        db.create_all()
@@ -0,0 +1,144 @@
+"""
+Query count regression tests.
+
+Requests every listing, search, detail and edit page through the test
+client and checks the statements and rows the per-request instrumentation
+counted against fixed limits, so a relationship that goes back to loading
+per row (an N+1) fails here instead of in production. They run on an
+in-memory SQLite database by default; facet counts and trigram search need
+Postgres, and SQLite reports no row counts for SELECTs, so for the full set
+point TEST_DATABASE_URL at a throwaway Postgres database (the schema is
+rebuilt through the migrations):
+
+    createdb fyyur_test
+    TEST_DATABASE_URL=postgresql://localhost/fyyur_test python -m pytest -q
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+from contextlib import contextmanager
+
+import pytest
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from conftest import POSTGRES, rebuild_schema
+from app import app, db, page_cache
+from model import Venue, Artist, rollover_show_counters
+from forms import LEGAL_GENRE_NAME, LEGAL_STATE_NAME
+from benchmarks.seed import seed, CITIES
+import facets
+
+requires_postgres = pytest.mark.skipif(not POSTGRES, reason='needs Postgres (TEST_DATABASE_URL)')
+
+VENUES = 20
+ARTISTS = 20
+# about 40 shows per venue/artist, more than a detail page shows
+SHOWS = 800
+PER_PAGE = 5
+SECTION = app.config['SHOWS_PER_SECTION']
+SEARCH_PAGE = app.config['SEARCH_PAGE_SIZE']
+# at most one facet_counts row per genre, state, city and seeking flag
+FACET_ROWS = len(LEGAL_GENRE_NAME) + len(LEGAL_STATE_NAME) + len(CITIES) + 2
+
+# (path, statements, rows) limits
+LISTINGS = [
+    # page state, directory page, facet counts
+    pytest.param('/venues?per_page={}'.format(PER_PAGE), 3, 1 + PER_PAGE + 1 + FACET_ROWS,
+                 marks=requires_postgres),
+    pytest.param('/artists?per_page={}'.format(PER_PAGE), 3, 1 + PER_PAGE + 1 + FACET_ROWS,
+                 marks=requires_postgres),
+    # page state, page
+    ('/venues/page?per_page={}'.format(PER_PAGE), 2, 1 + PER_PAGE + 1),
+    ('/artists/page?per_page={}'.format(PER_PAGE), 2, 1 + PER_PAGE + 1),
+    ('/shows?per_page={}'.format(PER_PAGE), 2, 1 + PER_PAGE + 1),
+    ('/shows/page?per_page={}'.format(PER_PAGE), 2, 1 + PER_PAGE + 1),
+    # count, page; see test_search.py for the SQLite fallback
+    pytest.param('/venues/search?search_term=a', 2, 1 + SEARCH_PAGE, marks=requires_postgres),
+    pytest.param('/artists/search?search_term=a', 2, 1 + SEARCH_PAGE, marks=requires_postgres),
+]
+# page state, venue/artist, upcoming shows, past shows (one extra for the
+# cursor), show counts
+DETAIL = (5, 1 + 1 + SECTION + SECTION + 1 + 1)
+# the venue/artist row, nothing else: SCALAR_ONLY raises on any relationship
+EDIT = (1, 1)
+
+@pytest.fixture(scope='module')
+def ids():
+    with app.app_context():
+        rebuild_schema()
+        seed(VENUES, ARTISTS, SHOWS)
+        yield {'venues': [id for id, in db.session.query(Venue.id)],
+               'artists': [id for id, in db.session.query(Artist.id)]}
+
+@pytest.fixture(autouse=True)
+def cold_caches():
+    # every request below is measured on a miss, the costliest case
+    page_cache.backend.clear()
+    facets._facet_cache.clear()
+
+def request_stats(path):
+    # -> RequestStats of GET path
+    with app.test_client() as client:
+        response = client.get(path)
+        assert response.status_code == 200, path
+        return g.request_stats
+
+@contextmanager
+def statements():
+    # the SQL of every statement run inside the block
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        yield seen
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+
+@pytest.mark.parametrize('path, statements, rows', LISTINGS)
+def test_listing(ids, path, statements, rows):
+    stats = request_stats(path)
+    assert stats.statements <= statements, path
+    assert stats.rows <= rows, path
+
+@pytest.mark.parametrize('kind', ['venues', 'artists'])
+def test_detail(ids, kind):
+    statements, rows = DETAIL
+    for id in ids[kind]:
+        path = '/{}/{}'.format(kind, id)
+        stats = request_stats(path)
+        assert stats.statements <= statements, path
+        assert stats.rows <= rows, path
+
+@pytest.mark.parametrize('kind', ['venues', 'artists'])
+def test_cached_detail(ids, kind):
+    # a page cache hit only reads the page state; pages whose next show has
+    # started are not cached until the counters roll over
+    with app.app_context():
+        rollover_show_counters()
+    path = '/{}/{}'.format(kind, ids[kind][0])
+    request_stats(path)
+    stats = request_stats(path)
+    assert stats.statements <= 1, path
+    assert stats.rows <= 1, path
+
+@pytest.mark.parametrize('kind', ['venues', 'artists'])
+def test_edit_form(ids, kind):
+    statements, rows = EDIT
+    for id in ids[kind]:
+        path = '/{}/{}/edit'.format(kind, id)
+        stats = request_stats(path)
+        assert stats.statements <= statements, path
+        assert stats.rows <= rows, path
+
+@pytest.mark.parametrize('kind', ['venues', 'artists'])
+def test_edit_form_leaves_shows_alone(ids, kind):
+    path = '/{}/{}/edit'.format(kind, ids[kind][0])
+    with statements() as seen:
+        request_stats(path)
+    assert seen, path
+    assert not [statement for statement in seen if '"Show"' in statement], path
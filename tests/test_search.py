@@ -0,0 +1,101 @@
+"""
+Search tests.
+
+Without Postgres (the default, see conftest.py) these exercise the
+in-process MemorySearchIndex fallback of search.py; against
+TEST_DATABASE_URL the same expectations hold for the pg_trgm search.
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import re
+
+import pytest
+
+from conftest import rebuild_schema
+from app import app, db
+from model import Venue, Artist, mark_for_delete
+from search import search
+import search as search_module
+
+@pytest.fixture(scope='module', autouse=True)
+def venues():
+    with app.app_context():
+        rebuild_schema()
+        # the schema was rebuilt under any index left by other tests
+        search_module._memory_indexes.clear()
+        db.session.add_all([Venue(name='Jazz Corner', city='Oakland', state='CA', genres=['Blues']),
+                            Venue(name='The Blue Room', city='Portland', state='OR', genres=['Jazz']),
+                            Venue(name='Folk Barn', city='Brooklyn', state='NY', genres=['Folk'])] +
+                           [Venue(name='Hall {}'.format(i), city='Austin', state='TX', genres=['Rock n Roll'])
+                            for i in range(1, 6)] +
+                           [Artist(name='Miles Quartet', city='Oakland', state='CA', genres=['Jazz'])])
+        db.session.commit()
+    yield
+
+@pytest.fixture(autouse=True)
+def context():
+    with app.app_context():
+        yield
+
+def names(results):
+    return [row['name'] for row in results['data']]
+
+@pytest.mark.parametrize('term, expected', [
+    ('corner', ['Jazz Corner']),      # name
+    ('oakland', ['Jazz Corner']),     # city
+    ('ny', ['Folk Barn']),            # state
+    ('blues', ['Jazz Corner']),       # genres
+    ('BROOK', ['Folk Barn']),         # any case, any part of a word
+    ('opera', []),
+])
+def test_matches(term, expected):
+    assert names(search(Venue, term)) == expected
+
+def test_artists():
+    assert names(search(Artist, 'quartet')) == ['Miles Quartet']
+    assert names(search(Artist, 'corner')) == []
+
+def test_name_ranks_above_other_fields():
+    # "jazz" is the name of one venue and a genre of the other
+    assert names(search(Venue, 'jazz')) == ['Jazz Corner', 'The Blue Room']
+
+def test_pages():
+    pages = [search(Venue, 'hall', page, 2) for page in (1, 2, 3)]
+    assert [results['count'] for results in pages] == [5, 5, 5]
+    assert [names(results) for results in pages] == [['Hall 1', 'Hall 2'], ['Hall 3', 'Hall 4'], ['Hall 5']]
+    assert [results['has_next'] for results in pages] == [True, True, False]
+    assert search(Venue, 'hall', 4, 2)['data'] == []
+
+def test_search_page(monkeypatch):
+    monkeypatch.setitem(app.config, 'SEARCH_PAGE_SIZE', 2)
+    client = app.test_client()
+
+    html = client.get('/venues/search', query_string={'search_term': 'hall', 'page': 2}).get_data(as_text=True)
+    assert re.findall(r'<h5>(.*?)</h5>', html) == ['Hall 3', 'Hall 4']
+    assert 'Previous' in html and 'Next' in html
+
+    html = client.post('/venues/search', data={'search_term': 'hall', 'page': 3}).get_data(as_text=True)
+    assert re.findall(r'<h5>(.*?)</h5>', html) == ['Hall 5']
+    assert 'Next' not in html
+
+def test_writes_invalidate_the_index():
+    assert names(search(Venue, 'zebra')) == []
+
+    venue = Venue(name='Zebra Lounge', city='Fresno', state='CA', genres=['Jazz'])
+    db.session.add(venue)
+    db.session.commit()
+    assert names(search(Venue, 'zebra')) == ['Zebra Lounge']
+
+    venue.name = 'Okapi Lounge'
+    db.session.commit()
+    assert names(search(Venue, 'zebra')) == []
+    assert names(search(Venue, 'okapi')) == ['Okapi Lounge']
+
+    # a Core UPDATE, seen through page_change_hooks
+    mark_for_delete(Venue, venue.id)
+    assert names(search(Venue, 'lounge')) == []
+
+    db.session.delete(db.session.get(Venue, venue.id))
+    db.session.commit()
+    assert names(search(Venue, 'fresno')) == []
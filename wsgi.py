@@ -0,0 +1,9 @@
+# ----------------------------------------------------------------------------#
+# WSGI entry point for production serving, see gunicorn.conf.py:
+#   FYYUR_ENV=production SECRET_KEY=... DATABASE_URL=... gunicorn -c gunicorn.conf.py wsgi:app
+# Each worker packs the autocomplete indexes in the background as it starts.
+# ----------------------------------------------------------------------------#
+from app import app
+from autocomplete import preload
+
+preload(app)